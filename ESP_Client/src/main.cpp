@@ -18,6 +18,7 @@
 #include <Secrets.h>
 
 #define DEBUG 1 // commentaar uit voor geen debug info  
+// #define PROTOCOL_V2 // binair record i.p.v. 64-byte header + JSON (server.py herkent beide)
 
 #define HEADER 64 //zelfde als server
 #define MAX_RETRYS 5
@@ -26,12 +27,18 @@
 #define JSON_BUFFER_SIZE 200
 #define TIME_BETWEEN_MEASUREMENTS 5000 // in ms
 #define MONITOR_BAUDRATE 115200
+#define V2_MAGIC 0xB2
+#define V2_KIND_RECORD 0x02
+#define V2_RECORD_SIZE 20 // node id, timestamp, temperature, pressure, altitude (elk 4 bytes)
 
 WiFiClient client;
 Adafruit_BMP280 bmp; // I2C instance
 
 // Functie declaraties
 void connectToServer();
+#ifdef PROTOCOL_V2
+void sendRecordV2(float temperature, float pressure, float altitude);
+#endif
 
 void setup() {
     Serial.begin(MONITOR_BAUDRATE );
@@ -87,6 +94,9 @@ void loop() {
             Serial.println("Verbonden met server!");
         #endif
     
+    #ifdef PROTOCOL_V2
+        sendRecordV2(temperature, pressure, altitude);
+    #else
         // Verstuur de lengte van het bericht eerst, zoals server verwacht
         String lenStr = String(jsonStr.length());
         while (lenStr.length() < HEADER) {
@@ -95,6 +105,7 @@ void loop() {
         client.print(lenStr);
         delay(10); // korte pauze
         client.print( jsonStr );    
+    #endif
 
         // Wacht op antwoord van server
         while (client.available() == 0) {
@@ -118,7 +129,48 @@ void connectToServer() {
     Serial.println("Verbind met server...");
     if (client.connect(serverIP, serverPort)) {
         Serial.println("Verbonden met server!");
+    #ifdef PROTOCOL_V2
+        // Protocol v2 afspreken: server antwoordt met dezelfde 2 bytes
+        uint8_t hello[2] = { V2_MAGIC, 2 };
+        client.write(hello, sizeof(hello));
+        uint8_t reply[2];
+        if (client.readBytes(reply, sizeof(reply)) != sizeof(reply) || reply[0] != V2_MAGIC) {
+            Serial.println("Server kent protocol v2 niet!");
+            client.stop();
+        }
+    #endif
     } else {
         Serial.println("Kan niet verbinden met server. Probeer later opnieuw...");
     }
-}
\ No newline at end of file
+}
+
+#ifdef PROTOCOL_V2
+// Schrijf een 32-bit waarde big-endian in de buffer
+static void putU32(uint8_t *buf, uint32_t value) {
+    buf[0] = value >> 24;
+    buf[1] = value >> 16;
+    buf[2] = value >> 8;
+    buf[3] = value;
+}
+
+static void putFloat(uint8_t *buf, float value) {
+    uint32_t bits;
+    memcpy(&bits, &value, sizeof(bits));
+    putU32(buf, bits);
+}
+
+// Eén frame in één write: 4 bytes lengte + soort + record (25 bytes i.p.v. ~130)
+void sendRecordV2(float temperature, float pressure, float altitude) {
+    uint8_t frame[4 + 1 + V2_RECORD_SIZE];
+    putU32(frame, 1 + V2_RECORD_SIZE);
+    frame[4] = V2_KIND_RECORD;
+    // node id: MAC-bytes 2..5. getEfuseMac() is little-endian, de lage bytes
+    // zijn het Espressif-prefix dat op elk bord gelijk is
+    putU32(frame + 5, (uint32_t) (ESP.getEfuseMac() >> 16));
+    putU32(frame + 9, 0); // geen klok: server zet het tijdstip
+    putFloat(frame + 13, temperature);
+    putFloat(frame + 17, pressure);
+    putFloat(frame + 21, altitude);
+    client.write(frame, sizeof(frame));
+}
+#endif
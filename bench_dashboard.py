@@ -0,0 +1,146 @@
+# Belastingstest voor dashboard.py met duizenden gesimuleerde abonnees
+    # Start dashboard.py als apart proces, laat `--sensors` nodes metingen
+    # sturen over de TCP-poort en verbindt `--subscribers` websocket-clients
+    # die het Socket.IO-protocol rechtstreeks spreken (Engine.IO v4). Een deel
+    # van de abonnees is traag en bevestigt updates pas na een pauze; de
+    # test toont dat zij updates verliezen terwijl de ingest blijft lopen.
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import simple_websocket
+
+from benchutil import free_port
+from framing import ACK, V2_HELLO, encode_record, recv_exact
+from server import raise_fd_limit
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.updates = 0
+        self.readings = 0
+        self.latency = [] # Seconds from ingest to arrival at the subscriber
+        self.sensor_acks = 0
+
+# Eén abonnee: minimale Socket.IO-client over een websocket
+def subscriber(url, subscription, delay, stats, stop):
+    try:
+        ws = simple_websocket.Client(url)
+        ws.receive(timeout=10) # Engine.IO open packet
+        ws.send("40") # Connect to the default namespace
+        while not ws.receive(timeout=10).startswith("40"):
+            pass
+        ws.send("42" + json.dumps(["subscribe", subscription]))
+    except Exception:
+        stats.failed += 1
+        return
+    stats.connected += 1
+    while not stop.ready():
+        try:
+            packet = ws.receive(timeout=0.5)
+        except Exception:
+            break
+        if packet is None:
+            continue
+        if packet == "2":
+            ws.send("3") # Engine.IO ping -> pong
+        elif packet.startswith("42"):
+            ack_id, _, payload = packet[2:].partition("[")
+            event, update = json.loads("[" + payload)
+            now = time.time()
+            stats.updates += 1
+            stats.readings += len(update)
+            stats.latency.append(now - max(r["ts"] for r in update.values()))
+            if delay:
+                eventlet.sleep(delay) # Slow consumer
+            if ack_id:
+                ws.send(f"43{ack_id}[]")
+    ws.close()
+
+# Eén ESP32-node die met vaste tussentijd metingen stuurt en op ACK wacht;
+# protocol v2-records zodat elke gesimuleerde node een eigen node id heeft
+def sensor(port, node, interval, stats, stop):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.sendall(V2_HELLO)
+    assert recv_exact(sock, len(V2_HELLO)) == V2_HELLO
+    rng = random.Random(node)
+    while not stop.ready():
+        sock.sendall(encode_record(node, rng.uniform(15, 25), 1013.25, 12.3))
+        assert recv_exact(sock, len(ACK)) == ACK
+        stats.sensor_acks += 1
+        eventlet.sleep(interval)
+    sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test dashboard.py with many websocket subscribers")
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--slow", type=float, default=0.1, help="Fraction of subscribers that ack slowly")
+    parser.add_argument("--slow-delay", type=float, default=3.0, help="Seconds a slow subscriber takes per update")
+    parser.add_argument("--sensors", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.1, help="Seconds between readings of one sensor")
+    parser.add_argument("--rooms", type=int, default=10, help="Sensors are spread over this many rooms")
+    parser.add_argument("--tick", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    tcp_port, web_port = free_port(), free_port()
+    # Sensor n is in room n % rooms
+    room_args = [f"--room=room{r}=" + ",".join(str(n) for n in range(r, args.sensors, args.rooms))
+                 for r in range(args.rooms)]
+    server = subprocess.Popen([sys.executable, "dashboard.py", "--host", "127.0.0.1", "--port", str(tcp_port),
+                               "--web-port", str(web_port), "--tick", str(args.tick)] + room_args,
+                              stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(2) # Give the server time to bind
+        url = f"ws://127.0.0.1:{web_port}/socket.io/?EIO=4&transport=websocket"
+        fast, slow, stop = Stats(), Stats(), eventlet.event.Event()
+        pool = eventlet.GreenPool(args.subscribers + args.sensors + 10)
+        for i in range(args.subscribers):
+            is_slow = i < args.subscribers * args.slow
+            subscription = {"room": f"room{i % args.rooms}"} if i % 2 else {"node": i % args.sensors}
+            pool.spawn(subscriber, url, subscription, args.slow_delay if is_slow else 0,
+                       slow if is_slow else fast, stop)
+            if i % 100 == 99:
+                eventlet.sleep(0.05) # Don't overflow the listen backlog
+        eventlet.sleep(2)
+        for node in range(args.sensors):
+            pool.spawn(sensor, tcp_port, node, args.interval, fast, stop)
+
+        t0 = time.perf_counter()
+        eventlet.sleep(args.duration)
+        elapsed = time.perf_counter() - t0
+        with urllib.request.urlopen(f"http://127.0.0.1:{web_port}/stats") as response:
+            server_stats = json.load(response)
+        stop.send()
+        pool.waitall()
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"[SUBSCRIBERS] {fast.connected + slow.connected} connected, {fast.failed + slow.failed} failed")
+    print(f"[INGEST] {fast.sensor_acks / elapsed:,.0f} readings/s acknowledged from {args.sensors} sensors")
+    for name, stats, count in (("fast", fast, fast.connected), ("slow", slow, slow.connected)):
+        if count:
+            print(f"[{name.upper()}] {stats.updates / elapsed / count:.2f} updates/s per subscriber, "
+                  f"latency p50 {percentile(stats.latency, 0.5) * 1000:.0f} ms, "
+                  f"p99 {percentile(stats.latency, 0.99) * 1000:.0f} ms")
+    print(f"[SERVER] {json.dumps(server_stats['broadcast'])}")
+
+if __name__ == "__main__":
+    main()
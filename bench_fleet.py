@@ -0,0 +1,307 @@
+# Lastgenerator die een vloot ESP32-nodes nabootst
+    # Elke gesimuleerde node doet wat main.cpp doet: verbinden (met
+    # MAX_RETRYS pogingen), om de TIME_BETWEEN_MEASUREMENTS een JSON-meting
+    # sturen als 64-byte header + bericht, en wachten op "ACK". Instelbaar:
+    # interval, grootte van het bericht, hoe de writes opgesplitst worden en
+    # reconnect-stormen waarbij een deel van de vloot tegelijk opnieuw
+    # verbindt. Alles loopt over localhost; resultaten gaan naar JSON zodat
+    # runs tussen commits vergeleken kunnen worden (--compare).
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+from framing import ACK, HEADER, V2_HELLO, encode_frame, encode_record
+from server import raise_fd_limit
+
+MAX_RETRYS = 5 # Same as main.cpp
+RETRY_DELAY = 1.0 # Seconds between connection attempts, as in main.cpp
+SPLIT_DELAY = 0.010 # delay(10) between header and message in main.cpp
+ACK_TIMEOUT = 10.0
+
+def percentile(values, p):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+# Zelfde document als serializeJson() in main.cpp, eventueel opgevuld
+# tot payload_size bytes
+def make_payload(rng, payload_size):
+    doc = {"temperature": round(rng.uniform(15, 30), 2), "pressure": round(rng.uniform(990, 1030), 2),
+           "altitude": round(rng.uniform(0, 200), 2)}
+    payload = json.dumps(doc, separators=(",", ":"))
+    if payload_size > len(payload):
+        doc["pad"] = "x" * max(0, payload_size - len(payload) - 9) # 9 = len(',"pad":""')
+        payload = json.dumps(doc, separators=(",", ":"))
+    return payload
+
+# Schrijf een frame zoals gekozen met --split; geeft het tijdstip van de
+# laatste byte terug
+async def send_frame(writer, frame, split, rng):
+    if split == "firmware":
+        writer.write(frame[:HEADER]) # client.print(lenStr)
+        await writer.drain()
+        await asyncio.sleep(SPLIT_DELAY)
+        writer.write(frame[HEADER:]) # client.print(jsonStr)
+    elif split == "random":
+        pos = 0
+        while pos < len(frame):
+            size = rng.randint(1, max(1, len(frame) // 2))
+            writer.write(frame[pos:pos + size])
+            await writer.drain()
+            pos += size
+            if pos < len(frame):
+                await asyncio.sleep(rng.uniform(0, 0.002))
+    else:
+        writer.write(frame)
+    await writer.drain()
+    return time.perf_counter()
+
+class Node:
+    def __init__(self, index, cfg):
+        self.index = index
+        self.cfg = cfg
+        self.rng = random.Random(cfg.seed * 1_000_003 + index)
+        self.reader = None
+        self.writer = None
+        self.kick = asyncio.Event() # Set by a reconnect storm
+        self.stormed = False
+
+    async def connect(self, stats):
+        for _ in range(MAX_RETRYS + 1):
+            t0 = time.perf_counter()
+            try:
+                self.reader, self.writer = await asyncio.open_connection(self.cfg.host, self.cfg.port)
+                if self.cfg.protocol == 2:
+                    self.writer.write(V2_HELLO)
+                    await self.reader.readexactly(len(V2_HELLO))
+            except (OSError, asyncio.IncompleteReadError):
+                stats["connect_errors"] += 1
+                await asyncio.sleep(RETRY_DELAY)
+                continue
+            stats["connects"] += 1
+            stats["connect_latency"].append(time.perf_counter() - t0)
+            return True
+        return False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.transport.abort()
+        self.reader = self.writer = None
+
+    def frame(self):
+        if self.cfg.protocol == 2:
+            return encode_record(self.index, self.rng.uniform(15, 30), self.rng.uniform(990, 1030), 12.3)
+        return encode_frame(make_payload(self.rng, self.cfg.payload_size))
+
+    async def run(self, stats, deadline):
+        cfg = self.cfg
+        await asyncio.sleep(self.rng.uniform(0, cfg.ramp)) # Nodes don't all boot at once
+        while time.perf_counter() < deadline:
+            if self.writer is None:
+                self.stormed = False # A storm that hit while idle has been handled by reconnecting
+                if not await self.connect(stats):
+                    await asyncio.sleep(cfg.interval) # "Kan niet verbinden met server"
+                    continue
+            # Local references: a storm may close this connection and clear
+            # self.writer while we wait; the aborted stream then raises below
+            reader, writer = self.reader, self.writer
+            frame = self.frame()
+            try:
+                sent = await send_frame(writer, frame, cfg.split, self.rng)
+                reply = await asyncio.wait_for(reader.readexactly(len(ACK)), ACK_TIMEOUT)
+                if reply != ACK:
+                    raise ConnectionError(f"unexpected reply {reply!r}")
+                stats["latency"].append(time.perf_counter() - sent)
+                stats["acked"] += 1
+                stats["bytes_sent"] += len(frame)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                if self.stormed:
+                    self.stormed = False # Our own storm, not a server error
+                else:
+                    stats["errors"] += 1
+                self.close()
+                continue
+            wait = max(0.0, cfg.interval + self.rng.uniform(-cfg.jitter, cfg.jitter))
+            try:
+                await asyncio.wait_for(self.kick.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            self.kick.clear()
+        self.close()
+
+# Om de storm_every seconden een deel van de vloot tegelijk laten herverbinden
+async def storms(nodes, cfg, stats, deadline, rng):
+    while True:
+        await asyncio.sleep(cfg.storm_every)
+        if time.perf_counter() >= deadline:
+            return
+        victims = rng.sample(nodes, int(len(nodes) * cfg.storm_fraction))
+        for node in victims:
+            if node.writer is not None:
+                node.stormed = True
+                node.close()
+            node.kick.set()
+        stats["storms"] += 1
+
+async def run_fleet(cfg, first, count):
+    stats = {"acked": 0, "errors": 0, "connects": 0, "connect_errors": 0, "storms": 0, "bytes_sent": 0,
+             "latency": [], "connect_latency": []}
+    deadline = time.perf_counter() + cfg.duration
+    nodes = [Node(i, cfg) for i in range(first, first + count)]
+    tasks = [asyncio.create_task(node.run(stats, deadline)) for node in nodes]
+    if cfg.storm_every:
+        tasks.append(asyncio.create_task(storms(nodes, cfg, stats, deadline, random.Random(cfg.seed + first))))
+    await asyncio.wait(tasks, timeout=cfg.duration + ACK_TIMEOUT + MAX_RETRYS * RETRY_DELAY)
+    for task in tasks:
+        task.cancel()
+    return stats
+
+def fleet_process(args):
+    raise_fd_limit()
+    return asyncio.run(run_fleet(*args))
+
+# RSS van de server plus al zijn kindprocessen (de workers), in bytes
+def rss_of(pid):
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, todo = 0, [pid]
+    while todo:
+        current = todo.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+        todo.extend(children.get(current, []))
+    return total
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(cfg, parts, elapsed, rss):
+    stats = {key: sum(p[key] for p in parts) for key in ("acked", "errors", "connects", "connect_errors", "storms",
+                                                          "bytes_sent")}
+    latency = sorted(x for p in parts for x in p["latency"])
+    connect_latency = sorted(x for p in parts for x in p["connect_latency"])
+    ms = lambda v: None if v is None else round(v * 1000, 3)
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(cfg).items() if k not in ("output", "compare", "spawn_server")},
+        "throughput_msg_s": round(stats["acked"] / elapsed, 1),
+        "throughput_bytes_s": round(stats["bytes_sent"] / elapsed, 1),
+        "ack_latency_ms": {"p50": ms(percentile(latency, 0.5)), "p99": ms(percentile(latency, 0.99)),
+                           "p999": ms(percentile(latency, 0.999)), "max": ms(latency[-1] if latency else None)},
+        "connect_latency_ms": {"p50": ms(percentile(connect_latency, 0.5)),
+                               "p99": ms(percentile(connect_latency, 0.99))},
+        "server_rss_mb": {"max": round(max(rss) / 1e6, 1), "last": round(rss[-1] / 1e6, 1)} if rss else None,
+        **stats,
+    }
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'metric':<24} {old.get('commit') or old_path:>12} {new.get('commit') or new_path:>12} {'change':>8}")
+    rows = [("throughput_msg_s", old["throughput_msg_s"], new["throughput_msg_s"])]
+    for key in ("p50", "p99", "p999"):
+        rows.append((f"ack {key} ms", old["ack_latency_ms"][key], new["ack_latency_ms"][key]))
+    if old.get("server_rss_mb") and new.get("server_rss_mb"):
+        rows.append(("server rss max MB", old["server_rss_mb"]["max"], new["server_rss_mb"]["max"]))
+    rows += [("errors", old["errors"], new["errors"]), ("connect_errors", old["connect_errors"], new["connect_errors"])]
+    for name, a, b in rows:
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else ""
+        print(f"{name:<24} {a!s:>12} {b!s:>12} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a fleet of ESP32 nodes against the socket server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=1, help="Spread the nodes over this many processes")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between readings (TIME_BETWEEN_MEASUREMENTS)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds on every interval")
+    parser.add_argument("--ramp", type=float, default=5.0, help="Spread the first connections over this many seconds")
+    parser.add_argument("--payload-size", type=int, default=0, help="Pad the JSON reading to this many bytes")
+    parser.add_argument("--protocol", type=int, choices=[1, 2], default=1, help="1: main.cpp JSON, 2: binary records")
+    parser.add_argument("--split", choices=["none", "firmware", "random"], default="firmware",
+                        help="firmware: header, 10 ms pause, message (as main.cpp); random: random chunks")
+    parser.add_argument("--storm-every", type=float, default=0, help="Seconds between reconnect storms (0: none)")
+    parser.add_argument("--storm-fraction", type=float, default=0.5, help="Fraction of nodes that reconnect in a storm")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-pid", type=int, default=None, help="Sample RSS of this server (and its workers)")
+    parser.add_argument("--spawn-server", default=None, metavar="ARGS",
+                        help='Start server.py on --host/--port with these extra arguments, e.g. "--mode async"')
+    parser.add_argument("--output", default=None, help="Write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    cfg = parser.parse_args()
+
+    if cfg.compare:
+        compare(*cfg.compare)
+        return
+
+    server = None
+    if cfg.spawn_server is not None:
+        server = subprocess.Popen([sys.executable, "server.py", "--host", cfg.host, "--port", str(cfg.port)]
+                                  + cfg.spawn_server.split(), stdout=subprocess.DEVNULL)
+        cfg.server_pid = server.pid
+        time.sleep(1.5) # Give the server time to bind
+    try:
+        share, extra = divmod(cfg.nodes, cfg.processes)
+        jobs, first = [], 0
+        for p in range(cfg.processes):
+            count = share + (p < extra)
+            jobs.append((cfg, first, count))
+            first += count
+        rss = []
+        t0 = time.perf_counter()
+        with multiprocessing.Pool(cfg.processes) as pool:
+            result = pool.map_async(fleet_process, jobs)
+            while not result.ready():
+                if cfg.server_pid:
+                    rss.append(rss_of(cfg.server_pid))
+                result.wait(1.0)
+            parts = result.get()
+        elapsed = min(time.perf_counter() - t0, cfg.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = summarize(cfg, parts, elapsed, rss)
+    lat, conn = report["ack_latency_ms"], report["connect_latency_ms"]
+    print(f"[FLEET] {cfg.nodes} nodes, commit {report['commit']}, {elapsed:.1f}s")
+    print(f"[THROUGHPUT] {report['throughput_msg_s']:,.0f} msg/s, {report['throughput_bytes_s'] / 1e3:,.1f} kB/s")
+    print(f"[ACK LATENCY] p50 {lat['p50']} ms, p99 {lat['p99']} ms, p999 {lat['p999']} ms, max {lat['max']} ms")
+    print(f"[CONNECT] {report['connects']} connects ({report['storms']} storms), p50 {conn['p50']} ms, "
+          f"p99 {conn['p99']} ms, {report['connect_errors']} failed attempts")
+    print(f"[ERRORS] {report['errors']}")
+    if report["server_rss_mb"]:
+        print(f"[SERVER RSS] max {report['server_rss_mb']['max']} MB, last {report['server_rss_mb']['last']} MB")
+    if cfg.output:
+        with open(cfg.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
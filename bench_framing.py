@@ -0,0 +1,83 @@
+# Fuzz- en benchmarkharnas voor de FrameDecoder
+    # Bouwt een bytestroom van willekeurige berichten, knipt die op
+    # willekeurige plaatsen in stukken (zoals TCP dat doet) en controleert
+    # dat de decoder exact dezelfde berichten teruggeeft.
+import argparse
+import json
+import random
+import time
+
+from framing import KIND_HELLO, KIND_TEXT, V2_HELLO, FrameDecoder, encode_frame, encode_frame_v2
+
+def make_messages(rng, count):
+    messages = []
+    for _ in range(count):
+        reading = {
+            "temperature": round(rng.uniform(-10, 40), 2),
+            "pressure": round(rng.uniform(950, 1050), 2),
+            "altitude": round(rng.uniform(0, 500), 2),
+        }
+        if rng.random() < 0.1:
+            reading["note"] = "x" * rng.randrange(0, 3000) # Occasional large frame
+        messages.append(json.dumps(reading).encode())
+    return messages
+
+# Knip de stroom in stukken van 1..max_chunk bytes
+def split_stream(rng, stream, max_chunk):
+    chunks = []
+    pos = 0
+    while pos < len(stream):
+        size = rng.randint(1, max_chunk)
+        chunks.append(stream[pos:pos + size])
+        pos += size
+    return chunks
+
+def decode_all(chunks):
+    decoder = FrameDecoder()
+    out = []
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for kind, frame in decoder.frames():
+            if kind != KIND_HELLO:
+                out.append(bytes(frame))
+    return out, decoder.pending()
+
+def fuzz(rounds, seed):
+    rng = random.Random(seed)
+    for i in range(rounds):
+        messages = make_messages(rng, rng.randint(1, 200))
+        if rng.random() < 0.5:
+            stream = b"".join(encode_frame(m) for m in messages)
+        else:
+            stream = V2_HELLO + b"".join(encode_frame_v2(KIND_TEXT, m) for m in messages)
+        chunks = split_stream(rng, stream, rng.choice([1, 7, 64, 65, 1500, 8192]))
+        decoded, leftover = decode_all(chunks)
+        if decoded != messages or leftover:
+            raise AssertionError(f"round {i}: decoded {len(decoded)}/{len(messages)} frames, {leftover} bytes left")
+    print(f"[FUZZ] {rounds} rounds OK (seed {seed})")
+
+def bench(count, max_chunk, seed):
+    rng = random.Random(seed)
+    messages = make_messages(rng, count)
+    stream = b"".join(encode_frame(m) for m in messages)
+    chunks = split_stream(rng, stream, max_chunk)
+    t0 = time.perf_counter()
+    decoded, _ = decode_all(chunks)
+    elapsed = time.perf_counter() - t0
+    assert len(decoded) == count
+    print(f"[BENCH] {count} frames in {len(chunks)} chunks (max {max_chunk} B): "
+          f"{count / elapsed:,.0f} frames/s, {len(stream) / elapsed / 1e6:,.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the HEADER frame decoder")
+    parser.add_argument("--rounds", type=int, default=500)
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    fuzz(args.rounds, args.seed)
+    for max_chunk in (16, 1500, 65536):
+        bench(args.frames, max_chunk, args.seed)
+
+if __name__ == "__main__":
+    main()
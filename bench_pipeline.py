@@ -0,0 +1,115 @@
+# Berichten per seconde: stop-and-wait ACK tegenover het venster-protocol
+    # Start server.py als apart proces en zet er een lokale proxy voor die
+    # elke richting met RTT/2 vertraagt, zodat een netwerk met 1, 20 of
+    # 100 ms round-trip tijd nagebootst wordt.
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchutil import READING, free_port
+from client import Pipeline
+from framing import ACK, V2_HELLO, encode_text_v2, recv_exact
+
+# Vertragingsproxy: bytes worden pas `delay` seconden na ontvangst doorgestuurd
+async def pump(reader, writer, delay):
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+
+    async def deliver():
+        while True:
+            due, data = await queue.get()
+            if data is None:
+                break
+            await asyncio.sleep(max(0, due - loop.time()))
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    task = asyncio.create_task(deliver())
+    while data := await reader.read(65536):
+        queue.put_nowait((loop.time() + delay, data))
+    queue.put_nowait((0, None))
+    await task
+
+async def run_proxy(listen_port, target_port, delay, ready):
+    async def on_connect(reader, writer):
+        up_reader, up_writer = await asyncio.open_connection("127.0.0.1", target_port)
+        await asyncio.gather(pump(reader, up_writer, delay), pump(up_reader, writer, delay),
+                             return_exceptions=True)
+
+    srv = await asyncio.start_server(on_connect, "127.0.0.1", listen_port)
+    ready.set()
+    async with srv:
+        await srv.serve_forever()
+
+def start_proxy(target_port, rtt):
+    port = free_port()
+    ready = threading.Event()
+    thread = threading.Thread(target=asyncio.run, args=(run_proxy(port, target_port, rtt / 2, ready),), daemon=True)
+    thread.start()
+    ready.wait()
+    return port
+
+def connect_v2(port):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(V2_HELLO)
+    assert recv_exact(sock, len(V2_HELLO)) == V2_HELLO
+    return sock
+
+def stop_and_wait(port, duration):
+    sock = connect_v2(port)
+    frame = encode_text_v2(READING)
+    sent = 0
+    deadline = time.perf_counter() + duration
+    t0 = time.perf_counter()
+    while time.perf_counter() < deadline:
+        sock.sendall(frame)
+        assert recv_exact(sock, len(ACK)) == ACK
+        sent += 1
+    elapsed = time.perf_counter() - t0
+    sock.close()
+    return sent / elapsed
+
+def windowed(port, duration, window):
+    sock = connect_v2(port)
+    pipeline = Pipeline(sock, window)
+    batch = [READING] * window
+    deadline = time.perf_counter() + duration
+    t0 = time.perf_counter()
+    while time.perf_counter() < deadline:
+        pipeline.send_many(batch)
+    pipeline.flush(timeout=10)
+    elapsed = time.perf_counter() - t0
+    sock.close()
+    return pipeline.acked / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Stop-and-wait vs windowed ACK throughput over a delay proxy")
+    parser.add_argument("--rtt", type=float, nargs="+", default=[1, 20, 100], help="Round-trip times in ms")
+    parser.add_argument("--window", type=int, nargs="+", default=[16, 256])
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per measurement")
+    parser.add_argument("--mode", choices=["thread", "async"], default="async", help="Server mode")
+    args = parser.parse_args()
+
+    server_port = free_port()
+    server = subprocess.Popen([sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(server_port),
+                               "--mode", args.mode], stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(1) # Give the server time to bind
+        print(f"{'rtt ms':>7} {'mode':<14} {'msg/s':>10}")
+        for rtt in args.rtt:
+            port = start_proxy(server_port, rtt / 1000)
+            print(f"{rtt:>7g} {'stop-and-wait':<14} {stop_and_wait(port, args.duration):>10,.0f}")
+            for window in args.window:
+                print(f"{rtt:>7g} {f'window {window}':<14} {windowed(port, args.duration, window):>10,.0f}")
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Vergelijk protocol v1 (64-byte ASCII header + JSON) met protocol v2
+    # (4-byte lengte + JSON of binair record): bytes per meting en de
+    # kost om een stroom metingen te decoderen tot Python-waarden.
+import argparse
+import json
+import random
+import time
+
+from framing import (KIND_HELLO, KIND_TEXT, V2_HELLO, FrameDecoder, decode_message, encode_frame,
+                     encode_record, encode_text_v2)
+
+def make_readings(rng, count):
+    return [(rng.randrange(1 << 32), round(rng.uniform(-10, 40), 2), round(rng.uniform(950, 1050), 2),
+             round(rng.uniform(0, 500), 2)) for _ in range(count)]
+
+# Zelfde JSON-document als serializeJson() in main.cpp
+def as_json(reading):
+    _, temperature, pressure, altitude = reading
+    return json.dumps({"temperature": temperature, "pressure": pressure, "altitude": altitude},
+                      separators=(",", ":"))
+
+def encode_stream(name, readings):
+    if name == "v1 json":
+        return b"".join(encode_frame(as_json(r)) for r in readings)
+    if name == "v2 json":
+        return V2_HELLO + b"".join(encode_text_v2(as_json(r)) for r in readings)
+    return V2_HELLO + b"".join(encode_record(*r) for r in readings)
+
+def parse_stream(stream, chunk):
+    decoder = FrameDecoder()
+    parsed = 0
+    for pos in range(0, len(stream), chunk):
+        decoder.feed(stream[pos:pos + chunk])
+        for kind, frame in decoder.frames():
+            if kind == KIND_HELLO:
+                continue
+            msg = decode_message(kind, frame)
+            if kind == KIND_TEXT:
+                msg = json.loads(msg)
+            parsed += 1
+    return parsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes-on-wire and parse cost of protocol v1 vs v2")
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=1460, help="Bytes per simulated recv()")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    readings = make_readings(random.Random(args.seed), args.readings)
+    print(f"{'format':<10} {'bytes/reading':>14} {'readings/s':>12} {'us/reading':>11}")
+    for name in ("v1 json", "v2 json", "v2 record"):
+        stream = encode_stream(name, readings)
+        t0 = time.perf_counter()
+        parsed = parse_stream(stream, args.chunk)
+        elapsed = time.perf_counter() - t0
+        assert parsed == len(readings)
+        print(f"{name:<10} {len(stream) / len(readings):>14.1f} {parsed / elapsed:>12,.0f} "
+              f"{elapsed / parsed * 1e6:>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Doorvoer van de ingest-pijplijn tegenover de oude print() per bericht
+    # "hot path" is de tijd die de ontvanger aan een bericht kwijt is
+    # (print of put in de wachtrij); "end to end" wacht ook tot de sink
+    # alles weggeschreven heeft.
+import argparse
+import contextlib
+import json
+import os
+import random
+import tempfile
+import time
+
+from sink import Ingest, PrintSink, open_sink
+
+def make_messages(count, seed):
+    rng = random.Random(seed)
+    return [json.dumps({"temperature": round(rng.uniform(-10, 40), 2), "pressure": round(rng.uniform(950, 1050), 2),
+                        "altitude": round(rng.uniform(0, 500), 2)}) for _ in range(count)]
+
+# Het oude pad: print in de ontvangstlus
+def bench_print(messages, out):
+    addr = ("192.168.0.50", 51234)
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        for msg in messages:
+            print(f"[{addr}] {msg}")
+    elapsed = time.perf_counter() - t0
+    return elapsed, elapsed
+
+def bench_ingest(messages, sink, out, policy, queue_size):
+    with contextlib.redirect_stdout(out):
+        ingest = Ingest(sink, queue_size, policy)
+        t0 = time.perf_counter()
+        for msg in messages:
+            ingest.put("192.168.0.50", msg)
+        hot = time.perf_counter() - t0
+        ingest.close()
+        total = time.perf_counter() - t0
+    metrics = ingest.metrics()
+    return hot, total, metrics
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest pipeline throughput vs per-message print()")
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--policy", default="block")
+    parser.add_argument("--stdout", default=os.devnull, help="Where print output goes (a file or a tty)")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, 1)
+    with tempfile.TemporaryDirectory() as tmp, open(args.stdout, "w") as out:
+        print(f"{'path':<16} {'hot path msg/s':>15} {'end to end msg/s':>17} {'batches':>8} {'avg batch ms':>13} {'dropped':>8}")
+        hot, total = bench_print(messages, out)
+        print(f"{'print()':<16} {len(messages) / hot:>15,.0f} {len(messages) / total:>17,.0f}")
+        sinks = [("queue + print", PrintSink()), ("queue + sqlite", open_sink(f"sqlite:{tmp}/readings.db")),
+                 ("queue + jsonl", open_sink(f"jsonl:{tmp}/readings.jsonl"))]
+        for name, sink in sinks:
+            hot, total, metrics = bench_ingest(messages, sink, out, args.policy, args.queue_size)
+            print(f"{name:<16} {len(messages) / hot:>15,.0f} {len(messages) / total:>17,.0f} {metrics['batches']:>8} "
+                  f"{metrics['batch_avg_ms']:>13.2f} {metrics['dropped']:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Wat kost de instrumentatie van stats.py?
+    # Start server.py afwisselend zonder en met --stats-port en meet
+    # berichten per seconde en server-CPU per bericht (uit /proc/<pid>/stat)
+    # onder dezelfde belasting: client-processen met elk een aantal
+    # verbindingen die stop-and-wait berichten sturen. Meerdere rondes,
+    # de mediaan telt, omdat client en server dezelfde CPU's delen.
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchutil import free_port, load_process
+
+def cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK") # utime + stime
+
+def measure(pool, args, extra, sink):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port), "--mode", args.mode,
+                               "--sink", f"jsonl:{sink}"] + extra, stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(1.5) # Give the server time to bind
+        cpu0, t0 = cpu_seconds(server.pid), time.perf_counter()
+        messages = sum(pool.map(load_process, [("messages", port, args.concurrency, args.duration)] * args.clients))
+        cpu, elapsed = cpu_seconds(server.pid) - cpu0, time.perf_counter() - t0
+    finally:
+        server.terminate()
+        server.wait()
+    return messages / elapsed, cpu / messages * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and server CPU with and without stats instrumentation")
+    parser.add_argument("--mode", choices=["thread", "async"], default="async")
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="Load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=50, help="Connections per client process")
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    variants = [("off", []), ("stats", ["--stats-port", str(free_port())])]
+    results = {name: ([], []) for name, _ in variants}
+    with tempfile.TemporaryDirectory() as tmp, multiprocessing.Pool(args.clients) as pool:
+        for r in range(args.rounds):
+            for name, extra in variants if r % 2 == 0 else variants[::-1]: # Alternate the order
+                rate, cpu = measure(pool, args, extra, os.path.join(tmp, f"{name}.jsonl"))
+                results[name][0].append(rate)
+                results[name][1].append(cpu)
+                print(f"[ROUND {r + 1}] {name:<5} {rate:>9,.0f} msg/s {cpu:>7.2f} us CPU/msg")
+
+    base_rate, base_cpu = (statistics.median(v) for v in results["off"])
+    for name, (rates, cpus) in results.items():
+        rate, cpu = statistics.median(rates), statistics.median(cpus)
+        print(f"[MEDIAN] {name:<5} {rate:>9,.0f} msg/s ({(rate / base_rate - 1) * 100:+.1f}%) "
+              f"{cpu:>7.2f} us CPU/msg ({(cpu / base_cpu - 1) * 100:+.1f}%)")
+
+if __name__ == "__main__":
+    main()
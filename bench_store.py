@@ -0,0 +1,61 @@
+# Ingest- en querysnelheid van de TimeSeriesStore bij 10k nodes
+    # Simuleert een vloot die elke `interval` seconden meet en voert de
+    # metingen in batches toe, zoals de ingest-pijplijn dat doet.
+import argparse
+import time
+
+import numpy as np
+
+from store import FIELDS, TimeSeriesStore
+
+def timed(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="TimeSeriesStore ingest rate and query latency")
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--rounds", type=int, default=300, help="Readings per node")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between readings of one node")
+    parser.add_argument("--batch", type=int, default=500, help="Readings per append_many()")
+    parser.add_argument("--capacity", type=int, default=256)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    store = TimeSeriesStore(capacity=args.capacity)
+    nodes = [f"node-{i}" for i in range(args.nodes)]
+    t_start = 1_700_000_000.0
+    total = args.nodes * args.rounds
+
+    # Round-robin over the fleet: every node reports once per interval
+    node_idx = np.tile(np.arange(args.nodes), args.rounds)
+    ts = t_start + np.repeat(np.arange(args.rounds) * args.interval, args.nodes) + rng.uniform(0, args.interval, total)
+    values = np.column_stack([rng.normal(20, 5, total), rng.normal(1013, 10, total), rng.normal(100, 20, total)])
+
+    t0 = time.perf_counter()
+    for pos in range(0, total, args.batch):
+        batch = node_idx[pos:pos + args.batch]
+        store.append_many([nodes[i] for i in batch], ts[pos:pos + args.batch], values[pos:pos + args.batch])
+    elapsed = time.perf_counter() - t0
+    print(f"[INGEST] {total:,} readings from {args.nodes:,} nodes in {elapsed:.2f}s: {total / elapsed:,.0f} readings/s")
+    print(f"[MEMORY] {store.bytes_per_node():,} bytes/node, {store.bytes_per_node() * args.nodes / 1e6:,.1f} MB for the fleet")
+
+    t_end = t_start + args.rounds * args.interval
+    some = nodes[:100]
+    queries = [
+        ("range scan, 1 node, last 10 min", lambda: store.range(nodes[0], t_end - 600, t_end)),
+        ("latest, all nodes", lambda: store.latest()),
+        ("aggregate last 10 min, 100 nodes", lambda: store.aggregate(FIELDS[0], t_end - 600, t_end, some)),
+        ("aggregate last 10 min, all nodes", lambda: store.aggregate(FIELDS[0], t_end - 600, t_end)),
+        ("1m rollup, all nodes", lambda: store.rollup("1m", FIELDS[1])),
+        ("1h rollup, all nodes", lambda: store.rollup("1h", FIELDS[1])),
+    ]
+    for name, query in queries:
+        print(f"[QUERY] {name:<36} {timed(query, 5):8.2f} ms")
+
+if __name__ == "__main__":
+    main()
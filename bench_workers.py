@@ -0,0 +1,47 @@
+# Schaalt de server mee met het aantal workers?
+    # Start server.py met 1..N workers en meet met een aantal
+    # client-processen (asyncio) hoeveel verbindingen per seconde
+    # (verbinden, één bericht, ACK, sluiten) en hoeveel berichten per seconde
+    # over open verbindingen de server verwerkt.
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from benchutil import free_port, load_process
+
+def measure(pool, processes, kind, port, concurrency, duration):
+    t0 = time.perf_counter()
+    counts = pool.map(load_process, [(kind, port, concurrency, duration)] * processes)
+    return sum(counts) / (time.perf_counter() - t0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Connections/s and messages/s for 1..N server workers")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=os.cpu_count() or 1, help="Load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=50, help="Connections per client process")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"[BENCH] {os.cpu_count()} CPUs, {args.clients} client processes x {args.concurrency} connections")
+    print(f"{'workers':>7} {'conn/s':>10} {'msg/s':>10} {'msg/s speedup':>14}")
+    base = None
+    with multiprocessing.Pool(args.clients) as pool:
+        for workers in args.workers:
+            port = free_port()
+            server = subprocess.Popen([sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port),
+                                       "--mode", "async", "--workers", str(workers)], stdout=subprocess.DEVNULL)
+            try:
+                time.sleep(1 + 0.5 * workers) # Give the workers time to start
+                conn_rate = measure(pool, args.clients, "connections", port, args.concurrency, args.duration)
+                msg_rate = measure(pool, args.clients, "messages", port, args.concurrency, args.duration)
+            finally:
+                server.terminate()
+                server.wait()
+            base = base or msg_rate
+            print(f"{workers:>7} {conn_rate:>10,.0f} {msg_rate:>10,.0f} {msg_rate / base:>13.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# Gedeelde hulpfuncties voor de bench_*.py scripts
+    # Vrije poort, een standaardmeting en de asyncio-belasting (verbinden
+    # per bericht, of stop-and-wait over open verbindingen) die in
+    # multiprocessing-pools draait.
+import asyncio
+import socket
+import time
+
+from framing import ACK, encode_frame
+
+READING = '{"temperature":21.53,"pressure":1013.25,"altitude":12.30}' # What main.cpp sends
+MESSAGE = encode_frame(READING)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# Verbinden, één bericht, ACK, sluiten
+async def connect_loop(port, deadline, counter):
+    while time.perf_counter() < deadline:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(MESSAGE)
+        await reader.readexactly(len(ACK))
+        writer.close()
+        await writer.wait_closed()
+        counter[0] += 1
+
+# Stop-and-wait over één open verbinding
+async def message_loop(port, deadline, counter):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    while time.perf_counter() < deadline:
+        writer.write(MESSAGE)
+        await reader.readexactly(len(ACK))
+        counter[0] += 1
+    writer.close()
+
+# kind: "connections" of "messages"; geeft het aantal ACKs terug
+async def run_load(kind, port, concurrency, duration):
+    counter = [0]
+    deadline = time.perf_counter() + duration
+    loop = connect_loop if kind == "connections" else message_loop
+    await asyncio.gather(*(loop(port, deadline, counter) for _ in range(concurrency)))
+    return counter[0]
+
+# Voor pool.map: args is (kind, port, concurrency, duration)
+def load_process(args):
+    return asyncio.run(run_load(*args))
@@ -1,26 +1,128 @@
+import select
 import socket
+import time
 
-HEADER = 64  # Size of the header for message length    
-FORMAT = 'utf-8' #  Encoding format
-DISCONNECT_MESSAGE = "!DISCONNECT"  
-SERVER = "192.168.0.35"  # Replace with the server's IP address       
+from framing import (ACK, DISCONNECT_MESSAGE, FORMAT, KIND_RECORD, KIND_TEXT, V2_HELLO, AckDecoder, FrameError,
+                     SEQ_MOD, encode_frame, encode_record, encode_seq_frame, encode_text_v2, pack_record,
+                     recv_exact, seq_after)
+
+SERVER = "192.168.0.35"  # Replace with the server's IP address
 PORT = 5050
 ADDR = (SERVER, PORT) # Define server address
+WINDOW = 64 # Frames that may be in flight without an ACK
+
+client = None
+version = 1 # Protocol version of the current connection
+pipeline = None # Pipeline for send_many() on the current connection
 
-client = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Create a TCP socket
-client.connect(ADDR) # Connect to the server    
+# Verbind met de server; met protocol=2 wordt eerst protocol v2 afgesproken
+def connect(addr=ADDR, protocol=1):
+    global client, version, pipeline
+    client = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Create a TCP socket
+    client.connect(addr) # Connect to the server
+    version = 1
+    pipeline = None
+    if protocol == 2:
+        client.sendall(V2_HELLO)
+        if recv_exact(client, len(V2_HELLO)) != V2_HELLO:
+            raise ConnectionError("server did not confirm protocol v2")
+        version = 2
 
 def send(msg):
-    message = msg.encode(FORMAT) # Encode the message
-    msg_length = len(message) # Get the length of the message
-    send_length = str(msg_length).encode(FORMAT) # Encode the length
-    send_length += b' ' * (HEADER - len(send_length)) # Pad the length to fit the header size
-    client.send(send_length) # Send the length
-    client.send(message) # Send the actual message
-    print(client.recv(2048).decode(FORMAT)) # Print server response (if any)
-
-send("Hello Server!")  # Example message
-input("Press Enter to continue...")  # Wait for user input before sending next message
-send("This is a test message.")
-input("Press Enter to continue...")  # Wait for user input before sending next message
-send(DISCONNECT_MESSAGE)  # Disconnect from the server  
+    frame = encode_text_v2(msg) if version == 2 else encode_frame(msg)
+    client.sendall(frame) # Send header and message in one write
+    print(recv_exact(client, len(ACK)).decode(FORMAT)) # Print server response
+
+# Verstuur één meting als binair record (alleen protocol v2)
+def send_record(node, temperature, pressure, altitude, timestamp=0):
+    if version != 2:
+        raise ValueError("records need protocol v2, connect with protocol=2")
+    client.sendall(encode_record(node, temperature, pressure, altitude, timestamp))
+    print(recv_exact(client, len(ACK)).decode(FORMAT)) # Print server response
+
+# Venster-protocol (protocol v2)
+    # Tot `window` frames mogen onbevestigd onderweg zijn. Elk frame krijgt
+    # een volgnummer en de server bevestigt cumulatief: één ACK_SEQ met
+    # nummer X bevestigt alle frames tot en met X. Er wordt enkel gewacht
+    # als het venster vol is of bij flush().
+class Pipeline:
+    def __init__(self, sock, window=WINDOW):
+        self.sock = sock
+        self.window = window
+        self.next_seq = 1 # Wraps modulo SEQ_MOD
+        self.acked = 0 # Newest sequence number the server confirmed
+        self.decoder = AckDecoder()
+
+    def in_flight(self):
+        return (self.next_seq - 1 - self.acked) % SEQ_MOD
+
+    # Lees alle ACKs die al binnen zijn; wacht hoogstens `timeout` seconden
+    def poll(self, timeout=0):
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return self.acked
+        if not self.decoder.recv_into(self.sock):
+            raise ConnectionError("server closed the connection")
+        try:
+            for seq in self.decoder.acks():
+                if seq_after(seq, self.acked):
+                    self.acked = seq
+        except FrameError as exc:
+            raise ConnectionError(str(exc)) from None
+        return self.acked
+
+    # Verstuur frames zonder op hun ACK te wachten, in zo groot mogelijke
+    # writes; blokkeert alleen zolang het venster vol zit
+    def send_frames(self, kind, bodies):
+        bodies = list(bodies)
+        pos = 0
+        while pos < len(bodies):
+            while self.in_flight() >= self.window:
+                self.poll(None) # Window full: wait for the next cumulative ACK
+            room = min(self.window - self.in_flight(), len(bodies) - pos)
+            batch = []
+            for body in bodies[pos:pos + room]:
+                batch.append(encode_seq_frame(self.next_seq, kind, body))
+                self.next_seq = (self.next_seq + 1) % SEQ_MOD
+            self.sock.sendall(b"".join(batch))
+            pos += room
+            self.poll() # Pick up ACKs that are already waiting
+        return (self.next_seq - 1) % SEQ_MOD
+
+    def send_nowait(self, msg):
+        return self.send_frames(KIND_TEXT, [msg.encode(FORMAT)])
+
+    def send_many(self, messages):
+        return self.send_frames(KIND_TEXT, (m.encode(FORMAT) for m in messages))
+
+    # records: tuples met de argumenten van encode_record()
+    def send_records(self, records):
+        return self.send_frames(KIND_RECORD, (pack_record(*r) for r in records))
+
+    # Wacht tot elk verstuurd frame bevestigd is
+    def flush(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.in_flight():
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"{self.in_flight()} frames still unacknowledged")
+            self.poll(remaining)
+
+# Verstuur meerdere berichten gepijplijnd over de huidige verbinding
+def send_many(messages, window=WINDOW):
+    global pipeline
+    if version != 2:
+        raise ValueError("send_many needs protocol v2, connect with protocol=2")
+    if pipeline is None:
+        pipeline = Pipeline(client, window)
+    pipeline.send_many(messages)
+    pipeline.flush()
+    print(f"ACK {pipeline.acked}") # Print the last cumulative acknowledgment
+
+if __name__ == "__main__":
+    connect()
+    send("Hello Server!")  # Example message
+    input("Press Enter to continue...")  # Wait for user input before sending next message
+    send("This is a test message.")
+    input("Press Enter to continue...")  # Wait for user input before sending next message
+    send(DISCONNECT_MESSAGE)  # Disconnect from the server
@@ -0,0 +1,277 @@
+# Live dashboard: metingen van de TCP-server doorsturen naar browsers
+    # Draait de socketserver (threaded modus, onder eventlet dus green
+    # threads) en een Flask-SocketIO app in hetzelfde proces. De ingest-
+    # pijplijn geeft elke batch aan de Broadcaster, die per tick één update
+    # per abonnee klaarzet met de laatste meting van elke node waarop die
+    # geabonneerd is (per node of per room). Elke abonnee heeft een eigen
+    # begrensde wachtrij; een trage abonnee verliest zijn oudste updates
+    # in plaats van de ingest op te houden.
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import collections
+import threading
+
+from flask import Flask, abort, request
+from flask_socketio import SocketIO
+
+from server import PORT, get_local_ip, make_listener, raise_fd_limit, start
+from sink import Ingest, TeeSink, is_reading, open_sink, parse_reading, store_of
+
+WEB_PORT = 8000
+TICK = 1.0 # Seconds between updates to a subscriber
+SUBSCRIBER_QUEUE = 8 # Updates buffered per subscriber before the oldest is dropped
+ACK_TIMEOUT = 5.0 # Seconds to wait for a subscriber to acknowledge an update
+MAX_MISSED_ACKS = 3 # Consecutive unacknowledged updates before a subscriber is disconnected
+MAX_SUBSCRIBERS = 10000 # Concurrent websocket connections the web server accepts
+ALL_ROOM = "all" # Every node is in this room
+
+PAGE = """<!doctype html>
+<html><head><title>ESP32 sensors</title>
+<script src="https://cdn.socket.io/4.7.5/socket.io.min.js"></script></head>
+<body>
+<h1>ESP32 sensors</h1>
+<form id="sub">room or node: <input id="key" value="all"> <button>subscribe</button></form>
+<table border="1" id="readings"><tr><th>node</th><th>temperature</th><th>pressure</th><th>altitude</th><th>time</th></tr></table>
+<script>
+const socket = io();
+const rows = new Map(); // node -> table row
+document.getElementById("sub").onsubmit = (e) => {
+  e.preventDefault();
+  const key = document.getElementById("key").value;
+  socket.emit("subscribe", key.startsWith("node:") ? {node: key.slice(5)} : {room: key});
+};
+socket.on("connect", () => socket.emit("subscribe", {room: "all"}));
+socket.on("readings", (update, ack) => {
+  for (const [node, r] of Object.entries(update)) {
+    if (!rows.has(node)) {
+      const row = document.getElementById("readings").insertRow();
+      for (let i = 0; i < 5; i++) { row.insertCell(); }
+      rows.set(node, row);
+    }
+    // textContent, never innerHTML: the values come from any TCP client
+    const values = [node, r.temperature, r.pressure, r.altitude, new Date(r.ts * 1000).toLocaleTimeString()];
+    values.forEach((value, i) => { rows.get(node).cells[i].textContent = value; });
+  }
+  ack(); // Flow control: the server sends the next update after this
+});
+</script></body></html>
+"""
+
+class Subscriber:
+    def __init__(self, sid):
+        self.sid = sid
+        self.nodes = set()
+        self.rooms = set()
+        self.queue = collections.deque()
+        self.ready = threading.Event()
+        self.connected = True
+        self.sent = 0 # Updates the subscriber acknowledged
+        self.dropped = 0
+        self.timeouts = 0
+        self.missed = 0 # Consecutive timeouts
+
+    def key(self):
+        return frozenset(self.nodes), frozenset(self.rooms)
+
+class Broadcaster:
+    def __init__(self, socketio, rooms=None, tick=TICK, queue_size=SUBSCRIBER_QUEUE):
+        self.socketio = socketio
+        self.rooms = rooms or {} # node id -> set of room names
+        self.tick = tick
+        self.queue_size = queue_size
+        self.pending = {} # node id -> latest reading in the current tick
+        self.subscribers = {} # sid -> Subscriber
+        self.readings = 0
+        self.updates = 0
+        self.dropped = 0
+        self.timeouts = 0
+
+    # Sink-interface (zie sink.py): wordt door de ingest-schrijver aangeroepen.
+    # Alleen metingen; "!DISCONNECT" of andere tekst zou de laatste meting
+    # van de node vervangen door een rij zonder waarden.
+    def write(self, batch):
+        for ts, node, msg in batch:
+            reading = parse_reading(msg)
+            if not is_reading(reading):
+                continue
+            self.pending[str(node)] = dict(reading, ts=ts) # Coalesce: keep the latest per node
+            self.readings += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def add(self, sid):
+        sub = self.subscribers[sid] = Subscriber(sid)
+        self.socketio.start_background_task(self.send_loop, sub)
+
+    def remove(self, sid):
+        sub = self.subscribers.pop(sid, None)
+        if sub is not None:
+            sub.connected = False
+            sub.ready.set()
+
+    def rooms_of(self, node):
+        return self.rooms.get(node, set()) | {ALL_ROOM}
+
+    # Eén keer per tick: bouw per abonnement één update en zet die in de
+    # wachtrij van elke abonnee; abonnees met hetzelfde abonnement delen hem
+    def run(self):
+        while True:
+            self.socketio.sleep(self.tick)
+            pending, self.pending = self.pending, {}
+            if not pending:
+                continue
+            node_rooms = {node: self.rooms_of(node) for node in pending}
+            updates = {}
+            for sub in list(self.subscribers.values()):
+                key = sub.key()
+                update = updates.get(key)
+                if update is None:
+                    nodes, rooms = key
+                    update = updates[key] = {node: reading for node, reading in pending.items()
+                                             if node in nodes or not rooms.isdisjoint(node_rooms[node])}
+                if not update:
+                    continue
+                if len(sub.queue) >= self.queue_size:
+                    sub.queue.popleft() # Slow consumer: drop its oldest update
+                    sub.dropped += 1
+                    self.dropped += 1
+                sub.queue.append(update)
+                sub.ready.set()
+
+    # Per abonnee: stuur de volgende update pas als de vorige bevestigd is.
+    # Wie MAX_MISSED_ACKS keer na elkaar niet bevestigt, wordt verbroken.
+    def send_loop(self, sub):
+        while sub.connected:
+            sub.ready.wait()
+            sub.ready.clear()
+            while sub.queue and sub.connected:
+                update = sub.queue.popleft()
+                acked = threading.Event()
+                self.socketio.emit("readings", update, to=sub.sid, callback=lambda *_: acked.set())
+                if acked.wait(ACK_TIMEOUT):
+                    sub.sent += 1
+                    sub.missed = 0
+                    self.updates += 1
+                    continue
+                sub.timeouts += 1
+                sub.missed += 1
+                self.timeouts += 1
+                if sub.missed >= MAX_MISSED_ACKS:
+                    print(f"[DASHBOARD] {sub.sid} missed {sub.missed} acks, disconnecting")
+                    self.remove(sub.sid)
+                    self.socketio.server.disconnect(sub.sid)
+
+    def metrics(self):
+        depths = [len(sub.queue) for sub in self.subscribers.values()]
+        return {
+            "subscribers": len(self.subscribers),
+            "readings": self.readings,
+            "updates_sent": self.updates,
+            "updates_dropped": self.dropped,
+            "ack_timeouts": self.timeouts,
+            "max_queue_depth": max(depths, default=0),
+        }
+
+app = Flask(__name__)
+socketio = SocketIO(app, async_mode="eventlet")
+broadcaster = Broadcaster(socketio)
+ingest = None
+
+@app.route("/")
+def index():
+    return PAGE
+
+@app.route("/stats")
+def stats():
+    return {"broadcast": broadcaster.metrics(), "ingest": ingest.metrics() if ingest else {}}
+
+# Geschiedenis uit de store (--sink store): /api/latest, /api/range?node=...,
+# /api/aggregate?field=...&t0=..., /api/rollup?resolution=1h
+@app.route("/api/<kind>")
+def api(kind):
+    store = store_of(ingest.sink) if ingest else None
+    if store is None:
+        abort(404, "no store, start the dashboard with --sink store")
+    from store import query # Only with --sink store, which already needs NumPy
+    try:
+        return query(store, kind, request.args.to_dict())
+    except KeyError as exc:
+        abort(404, f"unknown node {exc}")
+    except ValueError as exc:
+        abort(400, str(exc))
+
+@socketio.on("connect")
+def on_connect():
+    broadcaster.add(request.sid)
+
+@socketio.on("disconnect")
+def on_disconnect(*args):
+    broadcaster.remove(request.sid)
+
+# {"node": id}, {"nodes": [ids]} of {"room": naam}
+def nodes_in(data):
+    return {str(n) for n in data.get("nodes", [data["node"]] if "node" in data else [])}
+
+@socketio.on("subscribe")
+def on_subscribe(data):
+    sub = broadcaster.subscribers.get(request.sid)
+    if sub is None:
+        return
+    sub.nodes.update(nodes_in(data))
+    if "room" in data:
+        sub.rooms.add(data["room"])
+
+@socketio.on("unsubscribe")
+def on_unsubscribe(data):
+    sub = broadcaster.subscribers.get(request.sid)
+    if sub is None:
+        return
+    sub.nodes.difference_update(nodes_in(data))
+    sub.rooms.discard(data.get("room"))
+
+# "keuken=192.168.0.51,192.168.0.52" -> node -> {"keuken"}
+def parse_rooms(specs):
+    rooms = {}
+    for spec in specs:
+        name, _, nodes = spec.partition("=")
+        for node in nodes.split(","):
+            rooms.setdefault(node.strip(), set()).add(name)
+    return rooms
+
+def main():
+    global ingest
+    parser = argparse.ArgumentParser(description="Socket server with a live Socket.IO dashboard")
+    parser.add_argument("--host", default=None, help="Address to bind (default: local IP)")
+    parser.add_argument("--port", type=int, default=PORT, help="TCP port for the ESP32 nodes")
+    parser.add_argument("--web-port", type=int, default=WEB_PORT)
+    parser.add_argument("--tick", type=float, default=TICK, help="Seconds between updates to a subscriber")
+    parser.add_argument("--subscriber-queue", type=int, default=SUBSCRIBER_QUEUE)
+    parser.add_argument("--max-subscribers", type=int, default=MAX_SUBSCRIBERS)
+    parser.add_argument("--room", action="append", default=[], metavar="NAME=NODE,NODE",
+                        help="Put nodes in a named room (repeatable)")
+    parser.add_argument("--sink", default=None, help="Also store readings: print, sqlite:PATH, jsonl:PATH or store (queried via /api/...)")
+    args = parser.parse_args()
+
+    broadcaster.rooms = parse_rooms(args.room)
+    broadcaster.tick = args.tick
+    broadcaster.queue_size = args.subscriber_queue
+    ingest = Ingest(TeeSink([broadcaster, open_sink(args.sink)]) if args.sink else broadcaster, flush_interval=args.tick / 2)
+
+    host = args.host or get_local_ip() # Get local machine IP address
+    server = make_listener(host, args.port)
+
+    print("[STARTING] Server is starting...")
+    raise_fd_limit()
+    socketio.start_background_task(start, server, ingest)
+    socketio.start_background_task(broadcaster.run)
+    print(f"[DASHBOARD] http://{host}:{args.web_port}/")
+    socketio.run(app, host=host, port=args.web_port, log_output=False, max_size=args.max_subscribers)
+
+if __name__ == "__main__":
+    main()
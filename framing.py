@@ -0,0 +1,216 @@
+import struct
+import time
+
+HEADER = 64  # Size of the header for message length
+FORMAT = 'utf-8' #  Encoding format
+DISCONNECT_MESSAGE = "!DISCONNECT"
+ACK = b"ACK" # Acknowledgment the server sends for every message
+MAX_FRAME = 1 << 20 # Largest message we accept (1 MiB)
+
+# Protocol v2: compacte binaire framing
+    # Een v2-client opent met V2_HELLO; de server antwoordt met dezelfde
+    # twee bytes. Een v1-header begint altijd met een cijfer, dus de server
+    # herkent per verbinding aan de eerste byte welke versie gesproken wordt.
+    # v2-frame: 4 bytes lengte (big-endian) + 1 byte soort + inhoud.
+V2_MAGIC = 0xB2
+V2_HELLO = bytes([V2_MAGIC, 2])
+V2_HEADER = struct.Struct("!I")
+KIND_HELLO = -1 # Yielded once by the decoder when a v2 client says hello; outside 0-255, so no wire kind matches
+KIND_TEXT = 0x01 # UTF-8 text, e.g. the JSON document of main.cpp
+KIND_RECORD = 0x02 # One RECORD-packed sensor reading
+KIND_SEQ = 0x80 # Flag: body starts with a SEQ number, acknowledged cumulatively
+SEQ = struct.Struct("!I")
+SEQ_MOD = 1 << 32 # Sequence numbers wrap around modulo 2^32
+ACK_SEQ = struct.Struct("!3sI") # b"ACK" + highest sequence number received so far
+RECORD = struct.Struct("!IIfff") # node id, unix timestamp (0 = unknown), temperature, pressure, altitude
+RECORD_FIELDS = ("node", "timestamp", "temperature", "pressure", "altitude")
+
+class FrameError(ValueError):
+    pass
+
+# Bouw één frame: lengte opgevuld tot HEADER bytes, gevolgd door het bericht
+def encode_frame(message):
+    if isinstance(message, str):
+        message = message.encode(FORMAT) # Encode the message
+    send_length = str(len(message)).encode(FORMAT) # Encode the length
+    return send_length + b' ' * (HEADER - len(send_length)) + message # Pad the length to fit the header size
+
+def encode_frame_v2(kind, body):
+    return V2_HEADER.pack(len(body) + 1) + bytes([kind]) + body
+
+def encode_text_v2(message):
+    return encode_frame_v2(KIND_TEXT, message.encode(FORMAT))
+
+def pack_record(node, temperature, pressure, altitude, timestamp=0):
+    return RECORD.pack(node, timestamp, temperature, pressure, altitude)
+
+def encode_record(node, temperature, pressure, altitude, timestamp=0):
+    return encode_frame_v2(KIND_RECORD, pack_record(node, temperature, pressure, altitude, timestamp))
+
+# Frame met volgnummer voor het venster-protocol: de server antwoordt niet
+# per frame maar stuurt periodiek één cumulatieve ACK_SEQ
+def encode_seq_frame(seq, kind, body):
+    return encode_frame_v2(kind | KIND_SEQ, SEQ.pack(seq) + body)
+
+def encode_ack(seq):
+    return ACK_SEQ.pack(ACK, seq)
+
+# Volgnummers lopen rond; a is nieuwer dan b als a hoogstens een half
+# bereik voor ligt (serial number arithmetic, RFC 1982)
+def seq_after(a, b):
+    return 0 < (a - b) % SEQ_MOD < SEQ_MOD // 2
+
+# Haal het volgnummer uit een frame; seq is None voor gewone frames
+def split_seq(kind, payload):
+    if not kind & KIND_SEQ:
+        return kind, None, payload
+    if len(payload) < SEQ.size:
+        raise FrameError("sequenced frame without sequence number")
+    return kind & ~KIND_SEQ, SEQ.unpack_from(payload)[0], payload[SEQ.size:]
+
+# Zet een gedecodeerd frame om naar een bericht: str voor tekst,
+# dict voor een sensorrecord
+def decode_message(kind, payload):
+    if kind == KIND_TEXT:
+        return str(payload, FORMAT)
+    if kind == KIND_RECORD:
+        if len(payload) != RECORD.size:
+            raise FrameError(f"record of {len(payload)} bytes, expected {RECORD.size}")
+        reading = dict(zip(RECORD_FIELDS, RECORD.unpack(payload)))
+        if not reading["timestamp"]:
+            reading["timestamp"] = int(time.time()) # Node has no clock: stamp on arrival
+        return reading
+    raise FrameError(f"unknown frame kind {kind:#x}") # Includes 0, which no v2 frame may carry
+
+# Lees exact n bytes; recv() mag minder teruggeven dan gevraagd
+def recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        count = sock.recv_into(view[got:])
+        if not count:
+            raise ConnectionError("connection closed mid-frame")
+        got += count
+    return bytes(buf)
+
+# Incrementele decoder voor het HEADER-protocol (v1) en protocol v2
+    # Eén bytearray per verbinding; recv_into() schrijft rechtstreeks in de
+    # vrije ruimte en frames() geeft (soort, memoryview) paren op de buffer
+    # terug zonder te kopiëren. Een frame blijft geldig tot de volgende
+    # recv_into()/feed(). De versie wordt bij de eerste byte vastgelegd.
+class FrameDecoder:
+    def __init__(self, size=4096, max_frame=MAX_FRAME):
+        self.size = size
+        self.buffer = bytearray(size)
+        self.start = 0 # First byte that has not been consumed yet
+        self.end = 0 # One past the last byte received
+        self.max_frame = max_frame
+        self.version = None # 1 or 2 once the first byte has arrived
+        self.hello_pending = False
+
+    def pending(self):
+        return self.end - self.start
+
+    # Vrije ruimte achteraan de buffer; restbytes worden pas naar voren
+    # geschoven als de ruimte achteraan te klein wordt. Is alles verwerkt
+    # en de buffer gegroeid voor een groot frame, dan krimpt hij terug.
+    def get_buffer(self, sizehint=0):
+        want = max(sizehint, 1024)
+        if self.start == self.end:
+            self.start = self.end = 0 # Everything consumed: reuse from the front
+            if len(self.buffer) > self.size:
+                self.buffer = bytearray(self.size) # New buffer: old views stay valid
+        elif self.start and len(self.buffer) - self.end < want:
+            remaining = self.end - self.start
+            self.buffer[:remaining] = self.buffer[self.start:self.end] # Same length, so no resize
+            self.start, self.end = 0, remaining
+        if len(self.buffer) - self.end < want:
+            grown = bytearray(max(len(self.buffer) * 2, self.end + want)) # New buffer: old views stay valid
+            grown[:self.end] = self.buffer[:self.end]
+            self.buffer = grown
+        return memoryview(self.buffer)[self.end:]
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+
+    def recv_into(self, sock):
+        count = sock.recv_into(self.get_buffer())
+        self.end += count
+        return count
+
+    def feed(self, data):
+        view = self.get_buffer(len(data))
+        view[:len(data)] = data
+        self.end += len(data)
+
+    # Geef alle volledige frames terug die nu in de buffer zitten
+    def frames(self):
+        if self.version is None:
+            self.detect_version()
+        if self.version == 2:
+            return self.frames_v2()
+        if self.version == 1:
+            return self.frames_v1()
+        return iter(())
+
+    def detect_version(self):
+        if self.start == self.end:
+            return
+        if self.buffer[self.start] != V2_MAGIC:
+            self.version = 1
+        elif self.end - self.start < len(V2_HELLO):
+            return # Second hello byte has not arrived yet
+        elif self.buffer[self.start + 1] != V2_HELLO[1]:
+            raise FrameError(f"unsupported protocol version {self.buffer[self.start + 1]}")
+        else:
+            self.version = 2
+            self.hello_pending = True
+            self.start += len(V2_HELLO)
+
+    def frames_v1(self):
+        view = memoryview(self.buffer)
+        while self.end - self.start >= HEADER:
+            header = bytes(view[self.start:self.start + HEADER])
+            try:
+                msg_length = int(header) # Convert length to integer
+            except ValueError:
+                raise FrameError(f"bad header {header[:16]!r}") from None
+            if not 0 <= msg_length <= self.max_frame:
+                raise FrameError(f"frame length {msg_length} out of range")
+            frame_end = self.start + HEADER + msg_length
+            if frame_end > self.end:
+                return # Rest of the frame has not arrived yet
+            frame = view[self.start + HEADER:frame_end]
+            self.start = frame_end
+            yield KIND_TEXT, frame
+
+    def frames_v2(self):
+        if self.hello_pending:
+            self.hello_pending = False
+            yield KIND_HELLO, memoryview(b"")
+        view = memoryview(self.buffer)
+        while self.end - self.start >= V2_HEADER.size:
+            (msg_length,) = V2_HEADER.unpack_from(self.buffer, self.start)
+            if not 1 <= msg_length <= self.max_frame:
+                raise FrameError(f"frame length {msg_length} out of range")
+            body_start = self.start + V2_HEADER.size
+            frame_end = body_start + msg_length
+            if frame_end > self.end:
+                return # Rest of the frame has not arrived yet
+            kind = self.buffer[body_start]
+            frame = view[body_start + 1:frame_end]
+            self.start = frame_end
+            yield kind, frame
+
+# Decoder voor de antwoorden van de server op het venster-protocol
+    # ACK_SEQ-antwoorden hebben een vaste lengte en geen header; dezelfde
+    # buffer en recv_into() als FrameDecoder, acks() geeft de volgnummers.
+class AckDecoder(FrameDecoder):
+    def acks(self):
+        while self.end - self.start >= ACK_SEQ.size:
+            tag, seq = ACK_SEQ.unpack_from(self.buffer, self.start)
+            if tag != ACK:
+                raise FrameError(f"unexpected reply {bytes(self.buffer[self.start:self.start + 3])!r}")
+            self.start += ACK_SEQ.size
+            yield seq
@@ -1,5 +1,18 @@
+import argparse
+import asyncio
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
 import socket
+import sys
 import threading
+import time
+
+from framing import (ACK, DISCONNECT_MESSAGE, KIND_HELLO, V2_HELLO, FrameDecoder, FrameError, decode_message,
+                     encode_ack, split_seq)
+from sink import POLICIES, QUEUE_SIZE, Ingest, node_of, open_sink, store_of
+from stats import Profiler, Stats, log_stats, serve_stats
 
 # Functie om het lokale IP-adres te verkrijgen
     # Dit maakt gebruik van een tijdelijke socketverbinding
@@ -7,7 +20,7 @@ import threading
     # zonder daadwerkelijk gegevens te verzenden.
     # We gebruiken hier Google's openbare DNS-server (
 def get_local_ip():
-    
+
     # AF_INET is voor IPv4, SOCK_DGRAM voor UDP).
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -17,42 +30,433 @@ def get_local_ip():
     finally:
         s.close()
 
-SERVER = get_local_ip() # Get local machine IP address        
 PORT = 5050
-ADDR = (SERVER, PORT) # Define server address
-HEADER = 64  # Size of the header for message length    
-FORMAT = 'utf-8' #  Encoding format
-DISCONNECT_MESSAGE = "!DISCONNECT"  
+MAX_CONNECTIONS = 10000 # Connection cap for the event-loop server
+IDLE_TIMEOUT = 300 # Seconds without a frame before an idle client is dropped
+ACK_INTERVAL = 0.005 # Seconds over which cumulative ACKs for sequenced frames are coalesced
+WORKER_STATS = 5.0 # Seconds between aggregated worker reports from the supervisor
+RESTART_DELAY = 1.0 # Minimum seconds between restarts of the same worker
+STATS_HOST = "127.0.0.1" # The stats endpoint is for local scrapers only
 
-server = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Create a TCP socket
-server.bind(ADDR) # Bind the socket to the address  
+# Schrijf een antwoord naar de client; met stats wordt ook gemeten
+# hoe lang de write duurt
+def send_reply(conn, data, stats):
+    if stats is None:
+        conn.sendall(data)
+        return
+    t0 = time.perf_counter()
+    conn.sendall(data)
+    stats.sent(len(data), time.perf_counter() - t0)
 
-def handle_client(conn, addr):
+def handle_client(conn, addr, ingest, stats=None):
     print(f"[NEW CONNECTION] {addr} connected.")
-    
+    if stats is not None:
+        stats.connections_accepted += 1
+
+    decoder = FrameDecoder()
     connected = True
     while connected:
-        msg_length = conn.recv(HEADER).decode(FORMAT) # Receive message length
-        if msg_length:
-            msg_length = int(msg_length) # Convert length to integer
-            msg = conn.recv(msg_length).decode(FORMAT) # Receive the actual message
-            if msg == DISCONNECT_MESSAGE:
-                connected = False
-            
-            print(f"[{addr}] {msg}") # Print the received message
-            conn.send("ACK".encode(FORMAT)) # Send acknowledgment back to client       
-            
+        try:
+            nbytes = decoder.recv_into(conn) # Receive whatever has arrived
+            if not nbytes:
+                break # Client closed the connection
+            t0 = time.perf_counter()
+            frames = 0
+            ack_seq = None
+            for kind, frame in decoder.frames(): # Zero or more complete messages
+                if kind == KIND_HELLO:
+                    send_reply(conn, V2_HELLO, stats) # Confirm protocol v2
+                    continue
+                frames += 1
+                kind, seq, frame = split_seq(kind, frame)
+                msg = decode_message(kind, frame)
+                if msg == DISCONNECT_MESSAGE:
+                    connected = False
+
+                ingest.put(node_of(addr, msg), msg) # Hand the message to the writer thread
+                if seq is None:
+                    send_reply(conn, ACK, stats) # Send acknowledgment back to client
+                else:
+                    ack_seq = seq
+            if ack_seq is not None:
+                send_reply(conn, encode_ack(ack_seq), stats) # One cumulative ACK per received batch
+            if stats is not None:
+                stats.received(nbytes, frames, time.perf_counter() - t0)
+        except ConnectionError:
+            break # Client went away
+        except (FrameError, UnicodeDecodeError):
+            if stats is not None:
+                stats.decode_errors += 1
+            break # Malformed frame
+
     conn.close() # Close the connection
+    if stats is not None:
+        stats.connections_closed += 1
     print(f"[DISCONNECTED] {addr} disconnected.")
 
-def start():
+def start(server, ingest, stats=None):
     server.listen() # Start listening for connections
-    print(f"[LISTENING] Server is listening on {SERVER}")
+    print(f"[LISTENING] Server is listening on {server.getsockname()[0]}")
+    baseline = threading.active_count() # Main thread plus the ingest writer
     while True:
         conn, addr = server.accept() # Accept a new connection
-        thread = threading.Thread(target=handle_client, args=(conn, addr)) # Create a new thread for the client
+        thread = threading.Thread(target=handle_client, args=(conn, addr, ingest, stats)) # Create a new thread for the client
         thread.start() # Start the thread
-        print(f"[ACTIVE CONNECTIONS] {threading.active_count() - 1}") # Print number of active connections  
+        print(f"[ACTIVE CONNECTIONS] {threading.active_count() - baseline}") # Print number of active connections
+
+# Event-loop variant van handle_client
+    # Eén protocol-object per verbinding in plaats van één thread,
+    # zodat duizenden (meestal stille) ESP32 nodes in één thread passen.
+    # De transport schrijft rechtstreeks in de buffer van de FrameDecoder.
+class ClientProtocol(asyncio.BufferedProtocol):
+    active = 0 # Open connections over all instances
+    accepted = 0 # Connections accepted since start
+
+    def __init__(self, ingest, max_connections, idle_timeout, ack_interval, stats=None):
+        self.ingest = ingest
+        self.stats = stats
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.ack_interval = ack_interval
+        self.ack_seq = None # Highest sequence number not yet acknowledged
+        self.ack_handle = None
+        self.decoder = FrameDecoder()
+        self.transport = None
+        self.idle_handle = None
+        self.last_seen = 0.0
+        self.paused = False # Reading paused because the ingest queue is full
+
+    def connection_made(self, transport):
+        if ClientProtocol.active >= self.max_connections:
+            transport.abort() # Refuse: connection cap reached
+            if self.stats is not None:
+                self.stats.connections_rejected += 1
+            return
+        ClientProtocol.active += 1
+        ClientProtocol.accepted += 1
+        if self.stats is not None:
+            self.stats.connections_accepted += 1
+        self.transport = transport
+        self.addr = transport.get_extra_info("peername")
+        self.loop = asyncio.get_running_loop()
+        self.last_seen = self.loop.time()
+        self.idle_handle = self.loop.call_later(self.idle_timeout, self.check_idle)
+        print(f"[NEW CONNECTION] {self.addr} connected.")
+
+    def get_buffer(self, sizehint):
+        return self.decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.decoder.buffer_updated(nbytes)
+        self.last_seen = self.loop.time()
+        t0 = time.perf_counter()
+        frames = 0
+        try:
+            for kind, frame in self.decoder.frames(): # Zero or more complete messages
+                if kind == KIND_HELLO:
+                    self.reply(V2_HELLO) # Confirm protocol v2
+                    continue
+                frames += 1
+                kind, seq, frame = split_seq(kind, frame)
+                msg = decode_message(kind, frame)
+                self.ingest.put(node_of(self.addr, msg), msg, block=False) # Hand the message to the writer thread
+                if seq is None:
+                    self.reply(ACK) # Send acknowledgment back to client
+                else:
+                    self.ack_seq = seq
+                if msg == DISCONNECT_MESSAGE:
+                    self.flush_ack()
+                    self.transport.close()
+                    break
+        except (FrameError, UnicodeDecodeError):
+            if self.stats is not None:
+                self.stats.decode_errors += 1
+            self.transport.abort() # Malformed frame: the stream is out of sync
+            return
+        if self.stats is not None:
+            self.stats.received(nbytes, frames, time.perf_counter() - t0)
+        if self.ack_seq is not None and self.ack_handle is None:
+            self.ack_handle = self.loop.call_later(self.ack_interval, self.flush_ack)
+        if self.ingest.full() and not self.paused:
+            # Backpressure per connection: blocking here would freeze the whole loop
+            self.paused = True
+            self.transport.pause_reading()
+            self.ingest.when_space(self.space_available)
+
+    # Aangeroepen vanuit de schrijfthread van de ingest
+    def space_available(self):
+        try:
+            self.loop.call_soon_threadsafe(self.resume)
+        except RuntimeError:
+            pass # Loop already closed during shutdown
+
+    def resume(self):
+        self.paused = False
+        if not self.transport.is_closing():
+            self.last_seen = self.loop.time() # Time spent paused is not idle time
+            self.transport.resume_reading()
+
+    def reply(self, data):
+        if self.stats is None:
+            self.transport.write(data)
+            return
+        t0 = time.perf_counter()
+        self.transport.write(data)
+        self.stats.sent(len(data), time.perf_counter() - t0)
+
+    # Eén cumulatieve ACK dekt alle frames tot en met ack_seq
+    def flush_ack(self):
+        self.ack_handle = None
+        if self.ack_seq is not None:
+            self.reply(encode_ack(self.ack_seq))
+            self.ack_seq = None
+
+    # Eén timer per verbinding die zichzelf herplant, in plaats van
+    # een nieuwe timer per ontvangen frame
+    def check_idle(self):
+        idle = self.loop.time() - self.last_seen
+        if idle >= self.idle_timeout and not self.paused:
+            print(f"[IDLE] {self.addr} idle for {self.idle_timeout}s, closing.")
+            if self.stats is not None:
+                self.stats.connections_idle += 1
+            self.transport.abort()
+        else:
+            delay = self.idle_timeout if self.paused else self.idle_timeout - idle
+            self.idle_handle = self.loop.call_later(delay, self.check_idle)
+
+    def connection_lost(self, exc):
+        if self.transport is None:
+            return # Refused in connection_made
+        ClientProtocol.active -= 1
+        if self.stats is not None:
+            self.stats.connections_closed += 1
+        self.idle_handle.cancel()
+        if self.ack_handle is not None:
+            self.ack_handle.cancel()
+        print(f"[DISCONNECTED] {self.addr} disconnected.")
+
+async def start_async(server, ingest, max_connections, idle_timeout, ack_interval=ACK_INTERVAL, stats=None,
+                      profiler=None):
+    server.listen(max_connections) # Start listening for connections
+    server.setblocking(False)
+    loop = asyncio.get_running_loop()
+    if profiler is not None:
+        profiler.schedule = loop.call_soon_threadsafe # Profile the event-loop thread
+        if hasattr(signal, "SIGUSR1"):
+            loop.add_signal_handler(signal.SIGUSR1, profiler.start) # kill -USR1 <pid>: profile a window
+    srv = await loop.create_server(lambda: ClientProtocol(ingest, max_connections, idle_timeout, ack_interval, stats),
+                                   sock=server)
+    print(f"[LISTENING] Server is listening on {server.getsockname()[0]} (event loop, max {max_connections} connections)")
+    async with srv:
+        await srv.serve_forever()
+
+# Verhoog de limiet op open bestanden tot het maximum,
+    # anders loopt de server tegen 1024 verbindingen aan.
+def raise_fd_limit():
+    try:
+        import resource
+    except ImportError:
+        return # Not available on Windows
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def log_ingest(ingest, interval):
+    while True:
+        time.sleep(interval)
+        metrics = ingest.metrics()
+        print("[INGEST] " + " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items()))
+
+# Luisterende socket; met reuse_port kunnen meerdere processen op dezelfde
+# poort luisteren en verdeelt de kernel de verbindingen over hen
+def make_listener(host, port, reuse_port=False):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Create a TCP socket
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((host, port)) # Bind the socket to the address
+    return server
+
+def reuse_port_supported():
+    if not hasattr(socket, "SO_REUSEPORT"):
+        return False
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    except OSError:
+        return False # Defined but not implemented, e.g. some WSL kernels
+    return True
+
+# Start de ingest-pijplijn en de server op een gebonden socket
+def serve(server, args, worker=None, stats_pipe=None):
+    sink = args.sink if worker is None else args.sink.replace("{worker}", str(worker))
+    ingest = Ingest(open_sink(sink), args.queue_size, args.queue_policy)
+    if args.ingest_stats:
+        threading.Thread(target=log_ingest, args=(ingest, args.ingest_stats), daemon=True).start()
+    if stats_pipe is not None:
+        threading.Thread(target=report_worker, args=(worker, ingest, stats_pipe), daemon=True).start()
+    stats = None
+    profiler = Profiler()
+    if args.stats_port or args.stats_log:
+        stats = Stats()
+        stats.ingest_metrics = ingest.metrics
+    if args.stats_port:
+        serve_stats(stats, profiler, STATS_HOST, args.stats_port + (worker or 0), # One port per worker
+                    store_of(ingest.sink))
+    if args.stats_log:
+        threading.Thread(target=log_stats, args=(stats, args.stats_log), daemon=True).start()
+
+    try:
+        if args.mode == "async":
+            raise_fd_limit()
+            asyncio.run(start_async(server, ingest, args.max_connections, args.idle_timeout, args.ack_interval,
+                                    stats, profiler))
+        else:
+            start(server, ingest, stats)  # Start the server
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingest.close() # Write out what is still queued
+
+# Elke seconde de tellers van deze worker naar de supervisor sturen;
+# is de supervisor weg, dan stopt de worker netjes via SIGTERM
+def report_worker(worker, ingest, stats_pipe):
+    while True:
+        try:
+            stats_pipe.send({"worker": worker, "pid": os.getpid(), "active": ClientProtocol.active,
+                             "accepted": ClientProtocol.accepted, "messages": ingest.received,
+                             "dropped": ingest.dropped})
+        except OSError:
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        time.sleep(1)
+
+# SIGTERM stopt een worker (serve() vangt de KeyboardInterrupt en leegt de
+# wachtrij). Eén keer: een tweede signaal mag ingest.close() niet onderbreken.
+def stop_worker(signum, frame):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+def worker_main(worker, host, args, shared, stats_pipe):
+    # Ctrl-C reaches the whole process group; only the supervisor acts on it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, stop_worker)
+    server = shared if shared is not None else make_listener(host, args.port, reuse_port=True)
+    serve(server, args, worker, stats_pipe)
+
+# Supervisor voor --workers N
+    # Start N processen die elk een eigen SO_REUSEPORT-listener openen (of,
+    # zonder SO_REUSEPORT, samen één gedeelde socket gebruiken), verzamelt
+    # hun tellers en start een gecrashte worker opnieuw op. Elke worker heeft
+    # een eigen pipe, zodat een worker die halverwege een bericht sterft
+    # de rapportage van de andere niet blokkeert.
+def supervise(host, args):
+    ctx = multiprocessing.get_context("spawn")
+    if reuse_port_supported():
+        shared = None
+        reserved = make_listener(host, args.port, reuse_port=True) # Fails early if the port is taken
+        print(f"[WORKERS] {args.workers} workers with SO_REUSEPORT listeners")
+    else:
+        shared = reserved = make_listener(host, args.port)
+        print(f"[WORKERS] SO_REUSEPORT not available, {args.workers} workers share one listening socket")
+    workers = {}
+    pipes = {} # worker -> read end of its stats pipe
+    started = {}
+    latest = {} # worker -> last report of the running process
+    retired = {"accepted": 0, "messages": 0, "dropped": 0} # Totals of processes that exited
+    restarts = 0
+
+    def spawn(worker):
+        reader, writer = ctx.Pipe(duplex=False)
+        process = ctx.Process(target=worker_main, args=(worker, host, args, shared, writer),
+                              name=f"worker-{worker}", daemon=True)
+        process.start()
+        writer.close() # Only the worker writes
+        workers[worker] = process
+        pipes[worker] = reader
+        started[worker] = time.monotonic()
+
+    for worker in range(args.workers):
+        spawn(worker)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0)) # Stop the workers on SIGTERM too
+
+    last_log = time.monotonic()
+    last_messages = 0
+    try:
+        while True:
+            for reader in multiprocessing.connection.wait(list(pipes.values()), timeout=0.5):
+                try:
+                    report = reader.recv()
+                except (EOFError, OSError):
+                    continue # Worker died; handled below
+                latest[report["worker"]] = report
+            for worker, process in workers.items():
+                if process.is_alive() or time.monotonic() - started[worker] < RESTART_DELAY:
+                    continue
+                pipes.pop(worker).close()
+                print(f"[WORKER {worker}] pid {process.pid} exited with code {process.exitcode}, restarting")
+                last = latest.pop(worker, None)
+                if last is not None:
+                    for key in retired:
+                        retired[key] += last[key]
+                restarts += 1
+                spawn(worker)
+            now = time.monotonic()
+            if now - last_log >= args.worker_stats:
+                totals = {key: retired[key] + sum(r[key] for r in latest.values()) for key in retired}
+                active = sum(r["active"] for r in latest.values())
+                alive = sum(p.is_alive() for p in workers.values())
+                print(f"[WORKERS] {alive}/{args.workers} alive, active={active} accepted={totals['accepted']} "
+                      f"messages={totals['messages']} msg/s={(totals['messages'] - last_messages) / (now - last_log):.0f} "
+                      f"dropped={totals['dropped']} restarts={restarts}")
+                last_log, last_messages = now, totals["messages"]
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in workers.values():
+            if process.is_alive():
+                process.terminate() # SIGTERM: the worker flushes its ingest queue and exits
+        for process in workers.values():
+            process.join(timeout=2)
+            if process.is_alive():
+                process.kill()
+        reserved.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket server for ESP32 sensor nodes")
+    parser.add_argument("--host", default=None, help="Address to bind (default: local IP)")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread",
+                        help="thread: one thread per client, async: single event loop")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--ack-interval", type=float, default=ACK_INTERVAL,
+                        help="Coalescing interval for cumulative ACKs (async mode)")
+    parser.add_argument("--sink", default="print",
+                        help="print, sqlite:PATH, jsonl:PATH or store (queried via --stats-port /store/...); "
+                             "{worker} in PATH becomes the worker number")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Messages buffered before the policy applies")
+    parser.add_argument("--queue-policy", choices=POLICIES, default="block",
+                        help="What to do when the queue is full (block stalls the receivers; "
+                             "in async mode it pauses reading from the connections that fill it)")
+    parser.add_argument("--ingest-stats", type=float, default=0, help="Log ingest metrics every N seconds")
+    parser.add_argument("--stats-port", type=int, default=0,
+                        help="Serve /metrics (Prometheus text) and /profile?seconds=N on 127.0.0.1:PORT "
+                             "(worker N uses PORT+N)")
+    parser.add_argument("--stats-log", type=float, default=0, help="Log connection and frame stats every N seconds")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes, each running the event loop (implies --mode async)")
+    parser.add_argument("--worker-stats", type=float, default=WORKER_STATS,
+                        help="Seconds between aggregated worker reports")
+    args = parser.parse_args()
+
+    host = args.host or get_local_ip() # Get local machine IP address
+    print("[STARTING] Server is starting...")
+    if args.workers > 1:
+        args.mode = "async"
+        supervise(host, args)
+    else:
+        serve(make_listener(host, args.port), args)
 
-print("[STARTING] Server is starting...")
-start()  # Start the server
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# Ingest-pijplijn: ontvangst en opslag ontkoppeld via een begrensde wachtrij
+    # De server zet elk bericht met put() in de wachtrij; één schrijfthread
+    # haalt ze er in batches uit en geeft ze aan een sink (stdout, SQLite of
+    # JSONL). Als de wachtrij vol zit beslist de policy: wachten (block),
+    # het nieuwe bericht weggooien (drop) of het oudste weggooien (drop-oldest).
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+POLICIES = ("block", "drop", "drop-oldest")
+QUEUE_SIZE = 10000
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5 # Seconds a partial batch may wait before it is written
+FIELDS = ("temperature", "pressure", "altitude") # Keys of a sensor reading
+
+# Maak van een bericht een meting: records zijn al een dict, JSON van de
+# ESP32 wordt geparsed, al het andere blijft als ruwe tekst bewaard
+def parse_reading(msg):
+    if isinstance(msg, dict):
+        return msg
+    try:
+        reading = json.loads(msg)
+    except ValueError:
+        return {"raw": msg}
+    return reading if isinstance(reading, dict) else {"raw": msg}
+
+def is_reading(reading):
+    return all(name in reading for name in FIELDS)
+
+# Recordframes dragen zelf een node id; voor JSON van de ESP32 is het
+# IP-adres van de verbinding de beste sleutel
+def node_of(addr, msg):
+    if isinstance(msg, dict):
+        return msg["node"]
+    return addr[0]
+
+# Huidig gedrag van de server: één print per bericht
+class PrintSink:
+    def write(self, batch):
+        print("\n".join(f"[{node}] {msg}" for _, node, msg in batch))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class SQLiteSink:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL") # WAL stays consistent; fsync at checkpoints
+        self.db.execute("""CREATE TABLE IF NOT EXISTS readings (
+            ts REAL, node TEXT, temperature REAL, pressure REAL, altitude REAL, raw TEXT)""")
+
+    def write(self, batch):
+        rows = []
+        for ts, node, msg in batch:
+            reading = parse_reading(msg)
+            rows.append((ts, str(node), reading.get("temperature"), reading.get("pressure"),
+                         reading.get("altitude"), reading.get("raw")))
+        with self.db: # One transaction per batch
+            self.db.executemany("INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def flush(self):
+        pass # Every batch is already committed
+
+    def close(self):
+        self.db.close()
+
+# Append-only JSONL; fsync hoogstens om de fsync_interval seconden
+class JSONLSink:
+    def __init__(self, path, fsync_interval=1.0):
+        self.file = open(path, "a", encoding="utf-8")
+        self.fsync_interval = fsync_interval
+        self.last_sync = time.monotonic()
+
+    def write(self, batch):
+        lines = []
+        for ts, node, msg in batch:
+            reading = dict(parse_reading(msg), ts=ts, node=str(node))
+            lines.append(json.dumps(reading, separators=(",", ":")))
+        self.file.write("\n".join(lines) + "\n")
+        if time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# Geeft elke batch door aan meerdere sinks, bv. opslag én dashboard
+class TeeSink:
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, batch):
+        for sink in self.sinks:
+            sink.write(batch)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+# "print", "sqlite:readings.db", "jsonl:readings.jsonl" of "store" (in het
+# geheugen, opvraagbaar via HTTP); meerdere gescheiden door komma's,
+# bv. "print,sqlite:readings.db"
+def open_sink(spec):
+    if "," in spec:
+        return TeeSink([open_sink(part) for part in spec.split(",")])
+    kind, _, path = spec.partition(":")
+    if kind == "print":
+        return PrintSink()
+    if kind == "sqlite" and path:
+        return SQLiteSink(path)
+    if kind == "jsonl" and path:
+        return JSONLSink(path)
+    if kind == "store":
+        from store import StoreSink, TimeSeriesStore # NumPy is only needed for this sink
+        return StoreSink(TimeSeriesStore())
+    raise ValueError(f"unknown sink {spec!r}, use print, sqlite:PATH, jsonl:PATH or store")
+
+# De TimeSeriesStore achter een (Tee)sink, of None
+def store_of(sink):
+    if hasattr(sink, "store"):
+        return sink.store
+    for part in getattr(sink, "sinks", []):
+        store = store_of(part)
+        if store is not None:
+            return store
+    return None
+
+# Begrensde wachtrij tussen ontvangers en de schrijfthread
+    # Een deque in plaats van queue.Queue: append/popleft zijn atomair, dus
+    # put() neemt geen lock en wekt de schrijver alleen als die slaapt.
+class Ingest:
+    def __init__(self, sink, maxsize=QUEUE_SIZE, policy="block", batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}, use one of {', '.join(POLICIES)}")
+        self.sink = sink
+        self.items = collections.deque()
+        self.maxsize = maxsize
+        self.policy = policy
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ready = threading.Event() # Wakes the writer
+        self.writer_waiting = False
+        self.space = threading.Condition() # Wakes receivers blocked on a full queue
+        self.waiters = collections.deque() # Callbacks of paused receivers (event loop), see when_space()
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.lost = 0 # Messages in batches the sink failed to write
+        self.batch_seconds = 0.0 # Total time spent in sink.write()
+        self.batch_max = 0.0
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="ingest-writer", daemon=True)
+        self.thread.start()
+
+    # Zet een bericht in de wachtrij; False als het weggegooid is.
+    # Met block=False wacht put() bij policy block niet maar neemt het
+    # bericht toch aan; de aanroeper pauzeert dan zelf (zie full()).
+    def put(self, node, msg, block=True):
+        self.received += 1
+        if len(self.items) >= self.maxsize:
+            if self.policy == "drop":
+                self.dropped += 1
+                return False
+            if self.policy == "drop-oldest":
+                self.dropped += 1
+                try:
+                    self.items.popleft()
+                except IndexError:
+                    pass
+            elif block:
+                with self.space: # Backpressure: the receiver waits for the writer
+                    while len(self.items) >= self.maxsize:
+                        self.ready.set()
+                        self.space.wait(self.flush_interval)
+        self.items.append((time.time(), node, msg))
+        if self.writer_waiting:
+            self.ready.set()
+        return True
+
+    def take_batch(self):
+        batch = []
+        try:
+            while len(batch) < self.batch_size:
+                batch.append(self.items.popleft())
+        except IndexError:
+            pass
+        if self.policy == "block":
+            with self.space:
+                self.space.notify_all()
+            while self.waiters and len(self.items) < self.maxsize:
+                self.waiters.popleft()()
+        return batch
+
+    # Voor receivers die niet mogen blokkeren (de event loop): vol betekent
+    # ophouden met lezen tot when_space() terugroept
+    def full(self):
+        return self.policy == "block" and len(self.items) >= self.maxsize
+
+    # callback wordt vanuit de schrijfthread aangeroepen zodra er weer
+    # plaats is in de wachtrij
+    def when_space(self, callback):
+        self.waiters.append(callback)
+        self.ready.set() # Wake the writer so it checks, even if it just drained the queue
+
+    def run(self):
+        while True:
+            batch = self.take_batch()
+            if not batch:
+                if self.closed:
+                    break
+                self.writer_waiting = True
+                if not self.items: # Re-check after announcing, so no wakeup is lost
+                    if not self.ready.wait(self.flush_interval):
+                        self.sink.flush() # Idle: make what was written durable
+                self.ready.clear()
+                self.writer_waiting = False
+                continue
+            t0 = time.perf_counter()
+            try:
+                self.sink.write(batch)
+                self.written += len(batch)
+            except Exception as exc: # Keep draining: a dead writer would block every receiver
+                self.errors += 1
+                self.lost += len(batch)
+                print(f"[INGEST ERROR] {len(batch)} messages lost: {exc!r}")
+            elapsed = time.perf_counter() - t0
+            self.batches += 1
+            self.batch_seconds += elapsed
+            self.batch_max = max(self.batch_max, elapsed)
+        self.sink.close()
+
+    def metrics(self):
+        return {
+            "queue_depth": len(self.items),
+            "received": self.received,
+            "dropped": self.dropped,
+            "written": self.written,
+            "batches": self.batches,
+            "errors": self.errors,
+            "lost": self.lost,
+            "batch_avg_ms": self.batch_seconds / self.batches * 1000 if self.batches else 0.0,
+            "batch_max_ms": self.batch_max * 1000,
+        }
+
+    # Schrijf alles wat nog in de wachtrij zit weg en sluit de sink
+    def close(self):
+        self.closed = True
+        self.ready.set()
+        self.thread.join()
@@ -0,0 +1,251 @@
+# Tellers en histogrammen voor het hete pad van de server
+    # Eén Stats-object per proces. De ontvangstcode telt in gewone
+    # attributen (geen locks): in thread-modus kan een zeldzame gelijktijdige
+    # += een telling missen, voor monitoring is dat acceptabel. Histogrammen
+    # hebben vaste buckets van machten van twee microseconden; Stats.received
+    # en Stats.sent vinden de bucket met bit_length() en werken hem inline
+    # bij, zonder zoekwerk of extra aanroep. Uitlezen kan via een lokale HTTP-server
+    # (Prometheus-tekstformaat) of een periodieke logregel.
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKETS = 22 # Upper bounds 1 us .. 2^21 us (~2 s), plus +Inf
+PROFILE_SECONDS = 10.0 # Default length of a profiling window
+MAX_PROFILE_SECONDS = 300.0 # Longest window /profile accepts
+PROFILE_LINES = 30 # Functions listed in a profile report
+PROFILE_GRACE = 5.0 # Seconds the event loop gets to run the disable callback
+PREFIX = "socketapi_"
+
+COUNTERS = [
+    ("connections_accepted", "Connections accepted"),
+    ("connections_closed", "Connections closed, for any reason"),
+    ("connections_rejected", "Connections refused because the connection cap was reached"),
+    ("connections_idle", "Connections closed after the idle timeout"),
+    ("frames_in", "Frames received"),
+    ("bytes_in", "Bytes received"),
+    ("frames_out", "Replies written (ACK, cumulative ACK, hello)"),
+    ("bytes_out", "Bytes written"),
+    ("decode_errors", "Connections dropped because of a malformed frame"),
+]
+
+# Ingest.metrics(): welke sleutels alleen stijgen (counter) en welke
+# momentopnames zijn (gauge)
+INGEST_METRICS = {
+    "received": ("counter", "Messages handed to the ingest queue"),
+    "dropped": ("counter", "Messages dropped by the queue policy"),
+    "written": ("counter", "Messages written by the sink"),
+    "lost": ("counter", "Messages in batches the sink failed to write"),
+    "batches": ("counter", "Batches handed to the sink"),
+    "errors": ("counter", "Batches the sink failed to write"),
+    "queue_depth": ("gauge", "Messages waiting in the ingest queue"),
+    "batch_avg_ms": ("gauge", "Average sink write time per batch"),
+    "batch_max_ms": ("gauge", "Longest sink write time per batch"),
+}
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (BUCKETS + 1) # Bucket i holds values below 2^i us
+        self.sum = 0.0
+
+    def count(self):
+        return sum(self.counts)
+
+    # Bovengrens (seconden) van de bucket waarin percentiel p valt
+    def percentile(self, p):
+        total = self.count()
+        if not total:
+            return None
+        rank = total * p
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return 2 ** i / 1e6 if i < BUCKETS else float("inf")
+        return float("inf")
+
+    def render(self, name, help):
+        lines = [f"# HELP {PREFIX}{name} {help}", f"# TYPE {PREFIX}{name} histogram"]
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            le = f"{2 ** i / 1e6:g}" if i < BUCKETS else "+Inf"
+            lines.append(f'{PREFIX}{name}_bucket{{le="{le}"}} {seen}')
+        lines.append(f"{PREFIX}{name}_sum {self.sum:.9f}")
+        lines.append(f"{PREFIX}{name}_count {seen}")
+        return lines
+
+class Stats:
+    def __init__(self):
+        for name, _ in COUNTERS:
+            setattr(self, name, 0)
+        self.frame_latency = Histogram() # Decode, ingest.put and reply per frame, averaged over each receive
+        self.ack_latency = Histogram() # Time spent in transport.write / sendall for a reply
+        self.ingest_metrics = None # Optional callable, Ingest.metrics
+
+    # Eén ontvangstbatch: nbytes gelezen, frames verwerkt in elapsed seconden
+    def received(self, nbytes, frames, elapsed):
+        self.bytes_in += nbytes
+        if frames:
+            self.frames_in += frames
+            hist = self.frame_latency
+            i = int(elapsed * 1e6 / frames).bit_length()
+            hist.counts[i if i < BUCKETS else BUCKETS] += frames
+            hist.sum += elapsed
+
+    def sent(self, nbytes, elapsed):
+        self.frames_out += 1
+        self.bytes_out += nbytes
+        hist = self.ack_latency
+        i = int(elapsed * 1e6).bit_length()
+        hist.counts[i if i < BUCKETS else BUCKETS] += 1
+        hist.sum += elapsed
+
+    def active(self):
+        return self.connections_accepted - self.connections_closed
+
+    # Prometheus-tekstformaat (version 0.0.4)
+    def render(self):
+        lines = []
+        for name, help in COUNTERS:
+            lines += [f"# HELP {PREFIX}{name}_total {help}", f"# TYPE {PREFIX}{name}_total counter",
+                      f"{PREFIX}{name}_total {getattr(self, name)}"]
+        lines += [f"# HELP {PREFIX}connections_active Open connections", f"# TYPE {PREFIX}connections_active gauge",
+                  f"{PREFIX}connections_active {self.active()}"]
+        lines += self.frame_latency.render("frame_seconds", "Handling time per frame")
+        lines += self.ack_latency.render("ack_write_seconds", "Time to write one reply to the socket")
+        for name, value in (self.ingest_metrics() if self.ingest_metrics else {}).items():
+            kind, help = INGEST_METRICS.get(name, ("gauge", name.replace("_", " ")))
+            metric = f"{PREFIX}ingest_{name}" + ("_total" if kind == "counter" else "")
+            lines += [f"# HELP {metric} {help}", f"# TYPE {metric} {kind}", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        us = lambda v: "-" if v is None else f"{v * 1e6:.0f}us"
+        return (f"active={self.active()} accepted={self.connections_accepted} closed={self.connections_closed} "
+                f"rejected={self.connections_rejected} frames_in={self.frames_in} bytes_in={self.bytes_in} "
+                f"frames_out={self.frames_out} bytes_out={self.bytes_out} decode_errors={self.decode_errors} "
+                f"frame_p50<={us(self.frame_latency.percentile(0.5))} frame_p99<={us(self.frame_latency.percentile(0.99))} "
+                f"ack_p99<={us(self.ack_latency.percentile(0.99))}")
+
+def log_stats(stats, interval):
+    while True:
+        time.sleep(interval)
+        print("[STATS] " + stats.snapshot())
+
+# cProfile-venster dat tijdens het draaien aangezet kan worden
+    # cProfile profileert alleen de thread die enable() aanroept; daarom
+    # krijgt de Profiler een schedule-functie die enable/disable in de
+    # thread van de event loop uitvoert (loop.call_soon_threadsafe).
+class Profiler:
+    def __init__(self, schedule=None):
+        self.schedule = schedule
+        self.lock = threading.Lock() # One window at a time
+
+    def available(self):
+        return self.schedule is not None
+
+    # Blokkeert `seconds` seconden en geeft het rapport terug; None als er al
+    # een venster loopt
+    def run(self, seconds):
+        if not 0 < seconds <= MAX_PROFILE_SECONDS: # Also rejects NaN
+            raise ValueError(f"seconds must be in (0, {MAX_PROFILE_SECONDS:g}]")
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            profile = cProfile.Profile()
+            done = threading.Event()
+            try:
+                self.schedule(profile.enable)
+                time.sleep(seconds)
+                self.schedule(lambda: (profile.disable(), done.set()))
+            except RuntimeError:
+                return "no profile: the event loop is closed\n"
+            if not done.wait(PROFILE_GRACE):
+                # Loop blocked: the queued disable still runs after enable
+                # once it unblocks; don't hold the lock until then
+                profile.disable()
+                return f"no profile: the event loop did not respond within {PROFILE_GRACE}s\n"
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("tottime").print_stats(PROFILE_LINES)
+            return out.getvalue()
+        finally:
+            self.lock.release()
+
+    # Voor SIGUSR1: profileer op de achtergrond en print het rapport
+    def start(self, seconds=PROFILE_SECONDS):
+        def window():
+            report = self.run(seconds)
+            print(f"[PROFILE] {seconds}s window\n{report}" if report is not None else "[PROFILE] already running")
+        threading.Thread(target=window, daemon=True).start()
+
+# GET /metrics: Prometheus-tekst, GET /profile?seconds=N: cProfile-rapport,
+# GET /store/<latest|range|aggregate|rollup>?...: query op de store (--sink store)
+class StatsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == "/metrics":
+            self.reply(200, self.server.stats.render(), "text/plain; version=0.0.4")
+        elif url.path == "/profile":
+            profiler = self.server.profiler
+            if not profiler.available():
+                self.reply(501, "profiling needs --mode async\n")
+                return
+            query = urllib.parse.parse_qs(url.query)
+            try:
+                seconds = float(query.get("seconds", [PROFILE_SECONDS])[0])
+            except ValueError:
+                seconds = None
+            if seconds is None or not 0 < seconds <= MAX_PROFILE_SECONDS: # NaN fails the comparison too
+                self.reply(400, f"seconds must be a number in (0, {MAX_PROFILE_SECONDS:g}]\n")
+                return
+            report = profiler.run(seconds)
+            if report is None:
+                self.reply(409, "a profiling window is already running\n")
+            else:
+                self.reply(200, report)
+        elif url.path.startswith("/store/"):
+            self.store_query(url.path[len("/store/"):], url.query)
+        else:
+            self.reply(404, "try /metrics, /profile?seconds=N or /store/latest\n")
+
+    def store_query(self, kind, query_string):
+        if self.server.store is None:
+            self.reply(404, "no store, start the server with --sink store\n")
+            return
+        from store import query # Only with --sink store, which already needs NumPy
+        params = {name: values[0] for name, values in urllib.parse.parse_qs(query_string).items()}
+        try:
+            result = query(self.server.store, kind, params)
+        except KeyError as exc:
+            self.reply(404, f"unknown node {exc}\n")
+        except ValueError as exc:
+            self.reply(400, f"{exc}\n")
+        else:
+            self.reply(200, json.dumps(result), "application/json")
+
+    def reply(self, status, body, content_type="text/plain"):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass # Scrapes every few seconds would flood the console
+
+def serve_stats(stats, profiler, host, port, store=None):
+    httpd = ThreadingHTTPServer((host, port), StatsHandler)
+    httpd.daemon_threads = True
+    httpd.stats = stats
+    httpd.profiler = profiler
+    httpd.store = store
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    print(f"[STATS] http://{host}:{port}/metrics")
+    return httpd
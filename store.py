@@ -0,0 +1,266 @@
+# Kolomgebaseerde tijdreeksopslag voor sensormetingen
+    # Per node een ringbuffer met de laatste `capacity` metingen, opgeslagen
+    # als rijen in gedeelde NumPy-matrices (node x positie), zodat query's
+    # over duizenden nodes tegelijk gevectoriseerd kunnen worden. Daarnaast
+    # per resolutie (1 min, 1 h) een ring van buckets met min/max/som/aantal
+    # die bij elke batch incrementeel bijgewerkt wordt.
+    # Geheugen per node ligt vast: zie bytes_per_node().
+import math
+import threading
+
+import numpy as np
+
+from sink import FIELDS, parse_reading
+CAPACITY = 256 # Raw readings kept per node
+ROLLUPS = {"1m": (60, 120), "1h": (3600, 48)} # name: (seconds per bucket, buckets kept)
+INITIAL_NODES = 64 # Rows allocated up front; doubled when they run out
+QUERIES = ("latest", "range", "aggregate", "rollup") # Kinds accepted by query()
+
+class Rollup:
+    def __init__(self, seconds, slots, rows):
+        self.seconds = seconds
+        self.slots = slots
+        self.bucket = np.full((rows, slots), -1, np.int32) # Bucket number held by each slot
+        self.min = np.full((len(FIELDS), rows, slots), np.inf, np.float32)
+        self.max = np.full((len(FIELDS), rows, slots), -np.inf, np.float32)
+        self.sum = np.zeros((len(FIELDS), rows, slots), np.float32)
+        self.count = np.zeros((rows, slots), np.int32)
+
+    def grow(self, rows):
+        extra = rows - self.bucket.shape[0]
+        self.bucket = np.concatenate([self.bucket, np.full((extra, self.slots), -1, np.int32)])
+        self.min = np.concatenate([self.min, np.full((len(FIELDS), extra, self.slots), np.inf, np.float32)], axis=1)
+        self.max = np.concatenate([self.max, np.full((len(FIELDS), extra, self.slots), -np.inf, np.float32)], axis=1)
+        self.sum = np.concatenate([self.sum, np.zeros((len(FIELDS), extra, self.slots), np.float32)], axis=1)
+        self.count = np.concatenate([self.count, np.zeros((extra, self.slots), np.int32)])
+
+    # values: (velden, n) voor de metingen op rijen `rows` met tijd `ts`
+    def update(self, rows, ts, values):
+        buckets = (ts // self.seconds).astype(np.int32)
+        slots = buckets % self.slots
+        # Only the (row, slot) pairs in this batch are touched. Per pair the
+        # newest bucket wins; a slot still holding an older bucket is recycled
+        keys, inverse = np.unique(rows * self.slots + slots, return_inverse=True)
+        key_rows, key_slots = keys // self.slots, keys % self.slots
+        newest = self.bucket[key_rows, key_slots]
+        np.maximum.at(newest, inverse, buckets)
+        stale = newest != self.bucket[key_rows, key_slots]
+        stale_rows, stale_slots = key_rows[stale], key_slots[stale]
+        self.bucket[stale_rows, stale_slots] = newest[stale]
+        self.min[:, stale_rows, stale_slots] = np.inf
+        self.max[:, stale_rows, stale_slots] = -np.inf
+        self.sum[:, stale_rows, stale_slots] = 0
+        self.count[stale_rows, stale_slots] = 0
+        live = buckets == newest[inverse] # Drops readings older than their slot's bucket
+        rows, slots, values = rows[live], slots[live], values[:, live]
+        np.add.at(self.count, (rows, slots), 1)
+        for f in range(len(FIELDS)):
+            np.minimum.at(self.min[f], (rows, slots), values[f])
+            np.maximum.at(self.max[f], (rows, slots), values[f])
+            np.add.at(self.sum[f], (rows, slots), values[f])
+
+    def nbytes_per_row(self):
+        return sum(a.nbytes for a in (self.bucket, self.min, self.max, self.sum, self.count)) // self.bucket.shape[0]
+
+class TimeSeriesStore:
+    def __init__(self, capacity=CAPACITY, rollups=ROLLUPS, initial_nodes=INITIAL_NODES):
+        self.capacity = capacity
+        self.index = {} # node id -> row
+        self.nodes = [] # row -> node id
+        self.ts = np.full((initial_nodes, capacity), np.nan) # NaN marks an empty position
+        self.values = np.full((len(FIELDS), initial_nodes, capacity), np.nan, np.float32)
+        self.count = np.zeros(initial_nodes, np.int64) # Readings ever appended per node
+        self.rollups = {name: Rollup(seconds, slots, initial_nodes) for name, (seconds, slots) in rollups.items()}
+        self.lock = threading.Lock() # StoreSink writes from the ingest thread, query() reads from HTTP threads
+
+    def row_of(self, node):
+        row = self.index.get(node)
+        if row is None:
+            row = self.index[node] = len(self.nodes)
+            self.nodes.append(node)
+            if row == len(self.count):
+                self.grow(max(2 * row, 1))
+        return row
+
+    def grow(self, rows):
+        extra = rows - len(self.count)
+        self.ts = np.concatenate([self.ts, np.full((extra, self.capacity), np.nan)])
+        self.values = np.concatenate([self.values, np.full((len(FIELDS), extra, self.capacity), np.nan, np.float32)],
+                                     axis=1)
+        self.count = np.concatenate([self.count, np.zeros(extra, np.int64)])
+        for rollup in self.rollups.values():
+            rollup.grow(rows)
+
+    def bytes_per_node(self):
+        raw = self.capacity * (self.ts.itemsize + len(FIELDS) * self.values.itemsize) + self.count.itemsize
+        return raw + sum(r.nbytes_per_row() for r in self.rollups.values())
+
+    # Voeg een batch metingen toe
+    # nodes: n node ids, ts: n tijdstippen (s), values: n x (temperature, pressure, altitude)
+    def append_many(self, nodes, ts, values):
+        rows = np.fromiter((self.row_of(n) for n in nodes), np.int64, len(nodes))
+        ts = np.asarray(ts, np.float64)
+        values = np.asarray(values, np.float32).reshape(len(nodes), len(FIELDS)).T # Column per field
+        # Position of each reading in its node's ring: readings of the same
+        # node in one batch get consecutive positions, in batch order
+        order = np.argsort(rows, kind="stable")
+        sorted_rows = rows[order]
+        group_start = np.searchsorted(sorted_rows, sorted_rows, side="left")
+        rank = np.empty_like(rows)
+        rank[order] = np.arange(len(rows)) - group_start
+        pos = (self.count[rows] + rank) % self.capacity
+        self.ts[rows, pos] = ts
+        self.values[:, rows, pos] = values
+        np.add.at(self.count, rows, 1)
+        for rollup in self.rollups.values():
+            rollup.update(rows, ts, values)
+
+    def append(self, node, ts, temperature, pressure, altitude):
+        self.append_many([node], [ts], [(temperature, pressure, altitude)])
+
+    def rows_of(self, nodes):
+        if nodes is None:
+            return np.arange(len(self.nodes))
+        return np.array([self.index[n] for n in nodes], np.int64)
+
+    # Alle metingen van één node tussen t0 en t1, oudste eerst
+    def range(self, node, t0=-np.inf, t1=np.inf):
+        row = self.index[node]
+        ts = self.ts[row]
+        mask = (ts >= t0) & (ts < t1)
+        order = np.argsort(ts[mask], kind="stable")
+        result = {"ts": ts[mask][order]}
+        for f, name in enumerate(FIELDS):
+            result[name] = self.values[f, row][mask][order]
+        return result
+
+    # min/max/gemiddelde/aantal per node over de ruwe metingen tussen t0 en t1
+    def aggregate(self, field, t0=-np.inf, t1=np.inf, nodes=None):
+        rows = self.rows_of(nodes)
+        ts = self.ts[rows]
+        mask = (ts >= t0) & (ts < t1)
+        vals = self.values[FIELDS.index(field), rows]
+        count = mask.sum(axis=1)
+        has = count > 0
+        result = {"nodes": [self.nodes[r] for r in rows], "count": count}
+        for name, func, empty in (("min", np.min, np.inf), ("max", np.max, -np.inf)):
+            out = func(np.where(mask, vals, empty), axis=1, initial=empty)
+            result[name] = np.where(has, out, np.nan)
+        total = np.where(mask, vals, 0).sum(axis=1, dtype=np.float64)
+        result["mean"] = np.where(has, total / np.maximum(count, 1), np.nan)
+        return result
+
+    # Meest recente meting per node
+    def latest(self, nodes=None):
+        rows = self.rows_of(nodes)
+        pos = (self.count[rows] - 1) % self.capacity
+        result = {"nodes": [self.nodes[r] for r in rows], "ts": np.where(self.count[rows] > 0, self.ts[rows, pos], np.nan)}
+        for f, name in enumerate(FIELDS):
+            result[name] = self.values[f, rows, pos]
+        return result
+
+    # Samengevatte reeks per node uit een rollup; matrices (nodes x buckets),
+    # oudste bucket eerst, NaN voor lege buckets
+    def rollup(self, resolution, field, t0=-np.inf, t1=np.inf, nodes=None):
+        r = self.rollups[resolution]
+        rows = self.rows_of(nodes)
+        f = FIELDS.index(field)
+        bucket = r.bucket[rows]
+        order = np.argsort(bucket, axis=1)
+        bucket = np.take_along_axis(bucket, order, axis=1)
+        count = np.take_along_axis(r.count[rows], order, axis=1)
+        start = bucket.astype(np.float64) * r.seconds
+        keep = (count > 0) & (start >= t0 - r.seconds) & (start < t1)
+        result = {"nodes": [self.nodes[i] for i in rows], "time": np.where(keep, start, np.nan),
+                  "count": np.where(keep, count, 0)}
+        for name, data in (("min", r.min[f]), ("max", r.max[f])):
+            result[name] = np.where(keep, np.take_along_axis(data[rows], order, axis=1), np.nan)
+        total = np.take_along_axis(r.sum[f][rows], order, axis=1).astype(np.float64)
+        result["mean"] = np.where(keep, total / np.maximum(count, 1), np.nan)
+        return result
+
+# Meetwaarden als floats, of None als er één ontbreekt of niet eindig is:
+# ArduinoJson schrijft null voor NaN, bv. bij een mislukte BMP280-meting
+def finite_values(reading):
+    try:
+        values = [float(reading[name]) for name in FIELDS]
+    except (KeyError, TypeError, ValueError):
+        return None
+    return values if all(map(math.isfinite, values)) else None
+
+# Sink voor de ingest-pijplijn (zie sink.py) die metingen in de store zet
+    # Metingen met een ontbrekende of niet-eindige waarde worden overgeslagen
+    # (en geteld): één NaN zou min/max/gemiddelde van de hele bucket bederven.
+class StoreSink:
+    def __init__(self, store):
+        self.store = store
+        self.skipped = 0
+
+    def write(self, batch):
+        nodes, ts, values = [], [], []
+        for received, node, msg in batch:
+            reading = parse_reading(msg)
+            if "raw" in reading:
+                continue # Not a sensor reading, e.g. a plain text message
+            fields = finite_values(reading)
+            if fields is None:
+                self.skipped += 1
+                continue
+            nodes.append(node)
+            ts.append(reading.get("timestamp", received))
+            values.append(fields)
+        if nodes:
+            with self.store.lock:
+                self.store.append_many(nodes, ts, values)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+# Node id uit een URL: records hebben gehele ids, JSON-nodes een IP-adres
+def node_key(store, text):
+    if text in store.index:
+        return text
+    if text.isdigit() and int(text) in store.index:
+        return int(text)
+    raise KeyError(text)
+
+# NumPy-resultaten naar JSON: lijsten, NaN/inf wordt None
+def jsonable(value):
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, list):
+        return [jsonable(v) for v in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+# Query vanaf HTTP (dashboard of stats-server)
+    # kind: latest, range, aggregate of rollup; params: strings uit de URL
+    # (node, nodes=a,b, field, t0, t1, resolution). KeyError voor een
+    # onbekende node, ValueError voor een foute parameter.
+def query(store, kind, params):
+    field = params.get("field", FIELDS[0])
+    if field not in FIELDS:
+        raise ValueError(f"unknown field {field!r}, use one of {', '.join(FIELDS)}")
+    t0, t1 = float(params.get("t0", "-inf")), float(params.get("t1", "inf"))
+    with store.lock:
+        nodes = [node_key(store, n) for n in params["nodes"].split(",")] if params.get("nodes") else None
+        if kind == "latest":
+            result = store.latest(nodes)
+        elif kind == "range":
+            if "node" not in params:
+                raise ValueError("range needs node=")
+            result = store.range(node_key(store, params["node"]), t0, t1)
+        elif kind == "aggregate":
+            result = store.aggregate(field, t0, t1, nodes)
+        elif kind == "rollup":
+            resolution = params.get("resolution", "1m")
+            if resolution not in store.rollups:
+                raise ValueError(f"unknown resolution {resolution!r}, use one of {', '.join(store.rollups)}")
+            result = store.rollup(resolution, field, t0, t1, nodes)
+        else:
+            raise ValueError(f"unknown query {kind!r}, use one of {', '.join(QUERIES)}")
+    return {name: jsonable(value) for name, value in result.items()}